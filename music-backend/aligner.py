@@ -0,0 +1,267 @@
+import numpy as np
+
+
+# Start/end keys used by each timed event stream produced by the pipeline.
+CHORD_KEYS = ("start_time", "end_time")
+LYRIC_KEYS = ("start", "end")
+NOTE_KEYS = ("start", "end")
+
+
+class TimeIndex:
+    """
+    Interval index over a list of timed events, ordered by start time.
+
+    Point lookups use an elementary-segment table: `bounds` holds every
+    distinct start/end time and `active[i]` the latest-starting event active
+    on [bounds[i], bounds[i+1]) (-1 if none), so `at()` is one binary search
+    however much the events overlap (e.g. polyphonic notes with long
+    sustains). Range queries use a centered interval tree, built on first
+    use, and cost O(log n + k) for k results. Both take O(n) space.
+    """
+
+    def __init__(self, events, start_key="start", end_key="end"):
+        starts = np.array([float(e[start_key]) for e in events], dtype=np.float64)
+        ends = np.array([float(e[end_key]) for e in events], dtype=np.float64)
+        order = np.argsort(starts, kind="stable")
+
+        self.events = [events[i] for i in order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.bounds, self.active = _segment_table(self.starts, self.ends)
+        self._tree = None
+
+    def __len__(self):
+        return len(self.events)
+
+    def at(self, times):
+        """
+        Returns, for each query time, the index of the latest-starting event
+        active at that time (start <= t < end), or -1 if none is active.
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        if not len(self.bounds):
+            return np.full(times.shape, -1, dtype=np.int64)
+        seg = np.searchsorted(self.bounds, times, side="right") - 1
+        return np.where(seg >= 0, self.active[np.clip(seg, 0, None)], -1)
+
+    def overlapping(self, start, end):
+        """
+        Returns the indices (ascending) of all events that overlap [start, end).
+        """
+        if not len(self) or end <= start:
+            return np.empty(0, dtype=np.int64)
+        if self._tree is None:
+            self._tree = _IntervalTree(self.starts, self.ends)
+
+        # Events already sounding at `start`, plus those starting inside the range.
+        lo = np.searchsorted(self.starts, start, side="left")
+        hi = np.searchsorted(self.starts, end, side="left")
+        inside = np.arange(lo, hi)
+        inside = inside[self.ends[lo:hi] > start]
+        return np.sort(np.concatenate([self._tree.stab(start), inside]))
+
+    def to_dict(self):
+        """JSON-serializable form of the index (used by the frontend for lookups)."""
+        return {
+            "count": len(self),
+            "bounds": self.bounds.tolist(),
+            "active": self.active.tolist(),
+        }
+
+
+def _segment_table(starts, ends):
+    """
+    For each distinct start/end time b, finds the largest (start-ordered)
+    index j with starts[j] <= b < ends[j]. The candidates are a prefix of the
+    events, so this is "last index <= J with end > b": every query descends a
+    sparse table of block maxima of `ends`, skipping blocks that all end by b.
+    Vectorized over all bounds, O(n log n).
+    """
+    bounds = np.unique(np.concatenate([starts, ends]))
+    pos = np.searchsorted(starts, bounds, side="right") - 1
+    if not len(starts):
+        return bounds, pos
+
+    # block_max[k][j] = max(ends[j - 2**k + 1 .. j]).
+    block_max = [ends]
+    while (1 << len(block_max)) <= len(ends):
+        prev, half = block_max[-1], 1 << (len(block_max) - 1)
+        level = prev.copy()
+        level[half:] = np.maximum(prev[half:], prev[:-half])
+        block_max.append(level)
+
+    for k in range(len(block_max) - 1, -1, -1):
+        size = 1 << k
+        skip = (pos + 1 >= size) & (block_max[k][np.clip(pos, 0, None)] <= bounds)
+        pos = np.where(skip, pos - size, pos)
+
+    hit = pos >= 0
+    hit[hit] = ends[pos[hit]] > bounds[hit]
+    return bounds, np.where(hit, pos, -1)
+
+
+class _IntervalTree:
+    """
+    Centered interval tree over half-open intervals. Each node keeps the
+    intervals containing its center (the median start of its subtree), sorted
+    by start and by end; the rest go to the left (end <= center) or right
+    (start > center) child.
+    """
+
+    def __init__(self, starts, ends):
+        self.starts = starts
+        self.ends = ends
+        self.nodes = []
+        # Empty intervals never contain a point.
+        self.root = self._build(np.nonzero(ends > starts)[0])
+
+    def _build(self, ids):
+        if not len(ids):
+            return -1
+        s, e = self.starts[ids], self.ends[ids]
+        center = np.partition(s, len(s) // 2)[len(s) // 2]
+        here = ids[(s <= center) & (e > center)]
+        by_start = here[np.argsort(self.starts[here], kind="stable")]
+        by_end = here[np.argsort(-self.ends[here], kind="stable")]
+
+        node = len(self.nodes)
+        self.nodes.append(None)
+        left = self._build(ids[e <= center])
+        right = self._build(ids[s > center])
+        self.nodes[node] = (center, by_start, self.starts[by_start], by_end, -self.ends[by_end], left, right)
+        return node
+
+    def stab(self, t):
+        """Indices of the intervals with start < t < end."""
+        found = []
+        node = self.root
+        while node >= 0:
+            center, by_start, sorted_starts, by_end, neg_ends, left, right = self.nodes[node]
+            if t <= center:
+                # Every interval here ends after center >= t.
+                found.append(by_start[:np.searchsorted(sorted_starts, t, side="left")])
+                node = left if t < center else -1
+            else:
+                # Every interval here starts at or before center < t.
+                found.append(by_end[:np.searchsorted(neg_ends, -t, side="left")])
+                node = right
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+
+def char_offset(line, t):
+    """
+    Maps a time inside a lyric line to a character offset in its text.
+
+    Uses word timings when the line has them (`words`: [{start, end, text}]),
+    otherwise interpolates linearly over the line and snaps to the start of
+    the nearest following word so chords are never placed mid-word.
+    """
+    text = line.get("text", "")
+    if not text:
+        return 0
+
+    words = line.get("words")
+    if words:
+        # Find the word being sung at time t and place the chord at its start.
+        word_index = TimeIndex(words, *LYRIC_KEYS)
+        j = int(word_index.at(t)[0])
+        if j < 0:
+            j = max(0, int(np.searchsorted(word_index.starts, t, side="right")) - 1)
+        pos = 0
+        for k, w in enumerate(word_index.events):
+            found = text.find(w.get("text", ""), pos)
+            if found < 0:
+                break
+            if k == j:
+                return found
+            pos = found + len(w.get("text", ""))
+
+    start, end = float(line["start"]), float(line["end"])
+    if end <= start:
+        return 0
+    frac = min(max((t - start) / (end - start), 0.0), 1.0)
+    offset = int(round(frac * len(text)))
+    if offset >= len(text):
+        return len(text)
+
+    # Snap forward to the next word boundary.
+    while 0 < offset < len(text) and not text[offset - 1].isspace():
+        offset += 1
+    return min(offset, len(text))
+
+
+def align_lyrics_and_chords(lyrics_data, chords_data):
+    """
+    Aligns lyric lines with chord segments.
+
+    Each returned line carries `chord` (the chord active at the line start,
+    'N' if none) and `chords`: every chord change within the line as
+    {"chord", "time", "offset"}, where `offset` is the character position in
+    `text` at which the chord should be placed.
+    """
+    chord_index = TimeIndex(chords_data, *CHORD_KEYS)
+    line_starts = np.array([float(line["start"]) for line in lyrics_data], dtype=np.float64)
+    at_start = chord_index.at(line_starts)
+
+    merged = []
+    for line, active in zip(lyrics_data, at_start):
+        start, end = float(line["start"]), float(line["end"])
+        changes = []
+        for j in chord_index.overlapping(start, end):
+            chord = chord_index.events[j]
+            t = max(float(chord["start_time"]), start)
+            changes.append({
+                "chord": chord["chord_name"],
+                "time": t,
+                "offset": char_offset(line, t),
+            })
+
+        merged_line = {
+            "start": line["start"],
+            "end": line["end"],
+            "text": line["text"],
+            "chord": chord_index.events[active]["chord_name"] if active >= 0 else "N",
+            "chords": changes,
+        }
+        if "words" in line:
+            merged_line["words"] = line["words"]
+        merged.append(merged_line)
+
+    return merged
+
+
+def merge_lyrics_and_chords(lyrics_data, chords_data):
+    """
+    Merges timestamped lyrics with timestamped chords.
+    Each line gets the chord playing at its start ('chord') and every chord
+    change within the line with its character offset ('chords').
+    """
+    # If there are no lyrics, there's nothing to merge.
+    if not lyrics_data:
+        return []
+
+    return align_lyrics_and_chords(sort_events(lyrics_data), _valid(chords_data, CHORD_KEYS))
+
+
+def build_time_index(result):
+    """
+    Precomputes the time index of each stem's note stream, the only stream
+    the frontend looks up on every playback frame. Chords and lyric lines
+    are short enough that the client indexes them itself.
+    """
+    return {
+        "notes": {
+            stem: TimeIndex(_valid(notes, NOTE_KEYS), *NOTE_KEYS).to_dict()
+            for stem, notes in (result.get("notes") or {}).items()
+        },
+    }
+
+
+def sort_events(events, start_key="start"):
+    """Returns events ordered by start time (stable), as the index expects."""
+    return sorted(events or [], key=lambda e: float(e[start_key]))
+
+
+def _valid(events, keys):
+    # Chord analysis reports failures as [{"error": ...}]; skip such entries.
+    return [e for e in (events or []) if keys[0] in e and keys[1] in e]
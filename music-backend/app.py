@@ -1,8 +1,13 @@
 import os
+import uuid
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify, send_from_directory,make_response
 from flask_cors import CORS 
-from tasks import analyze_audio_task, celery
+from werkzeug.utils import secure_filename
+import task_signatures
+from task_signatures import celery
+import exporter
+import scheduler
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,6 +18,13 @@ app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['RESULTS_FOLDER'] = 'results'
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+def _remove_upload(filepath):
+    """Deletes an upload that was not admitted, so rejected files don't pile up."""
+    try:
+        os.remove(filepath)
+    except OSError as e:
+        app.logger.warning(f"Could not remove rejected upload {filepath}: {e}")
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -22,14 +34,41 @@ def upload_file():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    # Save file
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
+    # Optional comma-separated subset of task_signatures.STAGES
+    try:
+        stages = task_signatures.normalize_stages(request.form.get('stages'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Save file under a per-task name: jobs may wait in the scheduler for a
+    # while, and a later upload with the same name must not touch its input.
+    task_id = str(uuid.uuid4())
+    filepath = os.path.join(
+        app.config['UPLOAD_FOLDER'], f"{task_id}_{secure_filename(file.filename) or 'upload'}"
+    )
     file.save(filepath)
 
-    # Trigger Async Task
-    task = analyze_audio_task.delay(filepath, file.filename)
-    
-    return jsonify({"task_id": task.id, "message": "Processing started"}), 202
+    # Admit the job; the scheduler hands it to a worker when a slot is free.
+    # On rejection (either error below) the job was not stored.
+    try:
+        schedule = scheduler.submit(task_id, filepath, file.filename, stages=stages)
+    except scheduler.AdmissionRejected as e:
+        _remove_upload(filepath)
+        resp = jsonify({
+            "error": "Server is busy, please retry later",
+            "queue": e.queue,
+            "estimated_start_seconds": round(e.estimated_start_seconds, 1),
+        })
+        resp.headers['Retry-After'] = str(int(e.estimated_start_seconds - scheduler.ADMISSION_MAX_WAIT_SECONDS) + 1)
+        return resp, 503
+    except scheduler.LockError:
+        # Another upload or dispatch held the scheduler lock for too long.
+        _remove_upload(filepath)
+        resp = jsonify({"error": "Server is busy, please retry later"})
+        resp.headers['Retry-After'] = '5'
+        return resp, 503
+
+    return jsonify({"task_id": task_id, "message": "Processing started", **schedule}), 202
 
 @app.route('/status/<task_id>', methods=['GET'])
 def get_status(task_id):
@@ -43,6 +82,10 @@ def get_status(task_id):
     info = task_result.info
     if task_result.state == 'PENDING':
         response["status"] = "Pending..."
+        queued = scheduler.queue_status(task_id)
+        if queued:
+            response["status"] = "Queued"
+            response["info"] = {'progress': 0, 'queue': queued}
     elif task_result.state == 'SUCCESS':
         response["status"] = "Analysis complete!"
         response["info"] = {'progress': 100}
@@ -86,24 +129,24 @@ def get_result(task_id):
 @app.route('/cancel/<task_id>', methods=['POST'])
 def cancel_task(task_id):
     """
-    Cancels a specific Celery task, purges all other pending tasks from the queue,
-    and forgets the task's result.
+    Cancels a specific task: drops it from the scheduler if it is still
+    waiting, revokes it if it was already handed to a worker, and forgets
+    the task's result.
     """
     app.logger.info(f"Received cancellation request for task {task_id}")
     try:
-        # Step 1: Revoke the specific task.
+        # Step 1: Remove the job from the scheduler. If it never reached
+        # Celery there is nothing else to stop.
+        was_waiting = scheduler.cancel(task_id)
+        app.logger.info(f"Task {task_id} removed from scheduler (waiting={was_waiting}).")
+
+        # Step 2: Revoke the specific task.
         # If the task is running, terminate=True will attempt to kill the worker process.
-        # WARNING: This is an aggressive action and can corrupt the worker pool,
-        # which may be why new tasks get stuck in a PENDING state.
+        # WARNING: This is an aggressive action and can corrupt the worker pool.
         # If the task is pending, it will be marked as REVOKED.
-        celery.control.revoke(task_id, terminate=True)
-        app.logger.info(f"Task {task_id} revocation request sent.")
-
-        # Step 2: Purge all pending (un-started) tasks from the message queue.
-        # This will remove the canceled task if it was pending, along with ALL other
-        # tasks waiting in the queue.
-        purged_count = celery.control.purge()
-        app.logger.info(f"Purged {purged_count} pending tasks from the queue.")
+        if not was_waiting:
+            celery.control.revoke(task_id, terminate=True)
+            app.logger.info(f"Task {task_id} revocation request sent.")
 
         # Step 3: Forget the task's result from the result backend (e.g., Redis).
         # This removes the task's state and result from storage.
@@ -111,11 +154,41 @@ def cancel_task(task_id):
         app.logger.info(f"Task {task_id} result forgotten from backend.")
         return jsonify({
             "task_id": task_id,
-            "message": f"Task {task_id} cancellation request sent. {purged_count} pending tasks were purged from the queue."
+            "message": f"Task {task_id} cancellation request sent."
         }), 200
     except Exception as e:
-        app.logger.error(f"Error during task cancellation and purge for {task_id}: {e}")
-        return jsonify({"error": "Failed to send cancellation/purge request"}), 500
+        app.logger.error(f"Error during task cancellation for {task_id}: {e}")
+        return jsonify({"error": "Failed to send cancellation request"}), 500
+
+def _harmonic_index():
+    # Imported on first use: keeps numpy out of web worker startup
+    # (see bench_startup.py).
+    import fingerprint
+    return fingerprint.shared_index()
+
+@app.route('/similar/<task_id>', methods=['GET'])
+def similar_tracks(task_id):
+    """
+    Returns the analyzed tracks with the most similar chord progressions,
+    independent of key. Query parameter 'k' sets the number of results.
+    """
+    try:
+        k = max(1, min(int(request.args.get('k', 10)), 100))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+
+    matches = _harmonic_index().similar_to(task_id, k=k)
+    if matches is None:
+        return jsonify({"error": "Track not indexed"}), 404
+    return jsonify({"task_id": task_id, "similar": matches})
+
+@app.route('/duplicates/<task_id>', methods=['GET'])
+def duplicate_tracks(task_id):
+    """Returns earlier uploads that look like the same recording."""
+    matches = _harmonic_index().duplicates_of(task_id)
+    if matches is None:
+        return jsonify({"error": "Track not indexed"}), 404
+    return jsonify({"task_id": task_id, "duplicates": matches})
 
 @app.route('/files/<path:filename>', methods=['GET'])
 def serve_file(filename):
@@ -123,11 +196,51 @@ def serve_file(filename):
     Serves generated files.
     'filename' will be something like 'results/song_id/vocals.wav'
     """
-    allowed_folders = ['results', 'uploads']
+    allowed_folders = ['results', 'uploads', exporter.EXPORTS_DIRNAME]
     
     if not any(filename.startswith(folder + '/') for folder in allowed_folders):
         return jsonify({"error": "Access denied"}), 403
 
+    # 'exports/<task_id>/<song_id>.<ext>' is rendered lazily from the task
+    # result on first request and then served from the export cache.
+    if filename.startswith(exporter.EXPORTS_DIRNAME + '/'):
+        parts = filename.split('/')
+        if len(parts) != 3 or '.' not in parts[2]:
+            return jsonify({"error": "Export not found"}), 404
+        task_id, fmt = parts[1], parts[2].rsplit('.', 1)[1]
+        if fmt not in exporter.EXPORT_FORMATS:
+            return jsonify({"error": f"Unsupported export format: {fmt}"}), 404
+
+        task_result = celery.AsyncResult(task_id)
+        if task_result.state != 'SUCCESS':
+            return jsonify({"error": "Task not ready or failed"}), 400
+
+        # Only formats the task has content for are listed in its exports.
+        if fmt not in (task_result.result.get('exports') or exporter.EXPORT_FORMATS):
+            return jsonify({"error": f"No {fmt} export for this task"}), 404
+
+        # Cache hits are served directly. Misses are rendered by the exports
+        # worker, so this process never loads python-docx, reportlab or
+        # pretty_midi, and never waits for a render: the client retries.
+        result = task_result.result
+        path = exporter.cached_export(result, fmt, results_root=app.config['RESULTS_FOLDER'])
+        if path is None:
+            version = exporter.export_version(result)
+            render_id = task_signatures.export_render_id(task_id, fmt, version)
+            pending_key = f'exports:pending:{render_id}'
+            rendering = celery.AsyncResult(render_id)
+            if rendering.state == 'FAILURE':
+                app.logger.error(f"Failed to render {fmt} export for task {task_id}: {rendering.info}")
+                rendering.forget()
+                scheduler.get_redis().delete(pending_key)
+                return jsonify({"error": f"Failed to render {fmt} export"}), 500
+            if scheduler.get_redis().set(pending_key, 1, nx=True, ex=task_signatures.EXPORT_RENDER_TIMEOUT):
+                task_signatures.render_export(task_id, fmt, version)
+            resp = jsonify({"status": "rendering", "message": f"The {fmt} export is being rendered, please retry"})
+            resp.headers['Retry-After'] = '2'
+            return resp, 202
+        filename = path.replace(os.sep, '/')
+
     # Check for a query parameter to decide if it's a download request
     # This triggers the "Save As..." dialog in the browser.
     is_download = request.args.get('download') == 'true'
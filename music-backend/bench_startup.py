@@ -0,0 +1,58 @@
+"""
+Startup benchmark for the API process.
+
+Imports app.py in a fresh interpreter (as a gunicorn web worker would) and
+reports the import time, the peak RSS and whether any of the heavy analysis
+libraries were loaded.
+
+Usage:
+    python bench_startup.py [--runs 5] [--module app]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ["librosa", "tensorflow", "basic_pitch", "google.generativeai", "docx", "reportlab", "pretty_midi", "torch", "numpy"]
+
+_PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "max_rss_mb": rss_kb / 1024.0,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(module):
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="app")
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    times = [r["import_seconds"] for r in runs]
+    rss = [r["max_rss_mb"] for r in runs]
+
+    print(f"import {args.module}: {args.runs} runs")
+    print(f"  import time  median {statistics.median(times):.3f}s  max {max(times):.3f}s")
+    print(f"  peak RSS     median {statistics.median(rss):.1f} MB  max {max(rss):.1f} MB")
+    heavy = sorted({m for r in runs for m in r["heavy_loaded"]})
+    print(f"  heavy modules loaded: {', '.join(heavy) if heavy else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""
+Analysis engines. Each module pulls in its own heavy dependencies (librosa,
+Basic Pitch/TensorFlow, the Gemini client, ...) and is only imported on first
+use through analyzer.py.
+"""
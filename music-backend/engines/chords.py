@@ -0,0 +1,188 @@
+import os
+import librosa
+import numpy as np
+
+
+NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+def _build_chord_templates(include_sevenths=True):
+    """
+    Build simple normalized templates for triads (and optionally 7th chords).
+    Returns: dict: chord_name -> np.array(shape=(12,))
+    """
+    templates = {}
+
+    def tpl(root, intervals):
+        v = np.zeros(12, dtype=float)
+        for i in intervals:
+            v[(root + i) % 12] = 1.0
+        return v
+
+    for root in range(12):
+        root_name = NOTES[root]
+
+        # Triads
+        templates[f"{root_name}"]    = tpl(root, [0, 4, 7])   # major
+        templates[f"{root_name}m"]   = tpl(root, [0, 3, 7])   # minor
+        templates[f"{root_name}dim"] = tpl(root, [0, 3, 6])   # diminished
+        templates[f"{root_name}aug"] = tpl(root, [0, 4, 8])   # augmented
+
+        if include_sevenths:
+            templates[f"{root_name}7"]    = tpl(root, [0, 4, 7, 10])  # dominant 7
+            templates[f"{root_name}maj7"] = tpl(root, [0, 4, 7, 11])  # major 7
+            templates[f"{root_name}m7"]   = tpl(root, [0, 3, 7, 10])  # minor 7
+
+    # Normalize for cosine similarity
+    for k, v in templates.items():
+        n = np.linalg.norm(v)
+        if n > 0:
+            templates[k] = v / n
+
+    return templates
+
+
+CHORD_TEMPLATES = _build_chord_templates(include_sevenths=True)
+
+def _enforce_min_duration(chords, min_chord_duration):
+    """
+    Merge very short chord segments into the previous one.
+    This makes chords look more stable in time.
+    """
+    if not chords:
+        return []
+
+    merged = [chords[0]]
+
+    for seg in chords[1:]:
+        dur = seg["end_time"] - seg["start_time"]
+
+        if dur < min_chord_duration:
+            # Too short: merge into previous segment by extending its end
+            merged[-1]["end_time"] = max(merged[-1]["end_time"], seg["end_time"])
+        else:
+            merged.append(seg)
+
+    return merged
+
+def analyze_chords(
+    file_path,
+    hop_length=2048,
+    chord_threshold=0.2,
+    min_chord_duration=0.5,
+    use_hpss=True,
+    return_features=False
+):
+    """
+    Detect chords using Librosa chroma + template matching.
+
+    Returns:
+        List[dict]: [{ "start_time": float, "end_time": float, "chord_name": str }, ...]
+        or [{ "error": str }] on failure.
+        With return_features=True, a (chords, features) tuple where features
+        holds the beat-synchronous chroma used for fingerprinting, or None.
+    """
+    features = {} if return_features else None
+    chords = _detect_chords(file_path, hop_length, chord_threshold, min_chord_duration, use_hpss, features)
+    if return_features:
+        return chords, (features or None)
+    return chords
+
+
+def _beat_sync_chroma(y, sr, chroma, hop_length):
+    """Aggregates frame chroma between beats (median), shape (12, n_beats)."""
+    _, beats = librosa.beat.beat_track(y=y, sr=sr, hop_length=hop_length)
+    beats = librosa.util.fix_frames(beats, x_max=chroma.shape[1])
+    return librosa.util.sync(chroma, beats, aggregate=np.median)
+
+
+def _detect_chords(file_path, hop_length, chord_threshold, min_chord_duration, use_hpss, features):
+    try:
+        if not os.path.exists(file_path):
+            return [{"error": f"File not found: {file_path}"}]
+
+        # 1. Load
+        y, sr = librosa.load(file_path, mono=True)
+        if y.size == 0:
+            return [{"error": "Audio file appears to be empty."}]
+
+        # 2. HPSS
+        if use_hpss and y.size >= 4096:
+            try:
+                y_harm, _ = librosa.effects.hpss(y)
+            except Exception:
+                y_harm = y
+        else:
+            y_harm = y
+
+        # 3. Chromagram
+        chroma = librosa.feature.chroma_cqt(y=y_harm, sr=sr, hop_length=hop_length)
+        if chroma.shape[1] == 0:
+            return [{"error": "Could not compute chroma (audio too short or silent)."}]
+
+        chroma_norm = chroma / (np.linalg.norm(chroma, axis=0, keepdims=True) + 1e-8)
+
+        # Keep the chroma for the harmonic fingerprint instead of discarding it.
+        if features is not None:
+            try:
+                features["beat_chroma"] = _beat_sync_chroma(y, sr, chroma, hop_length)
+            except Exception as e:
+                print(f"--- [WARN] Could not compute beat-synchronous chroma: {e}")
+
+        # 4. Template matching
+        template_names = list(CHORD_TEMPLATES.keys())
+        template_matrix = np.stack(
+            [CHORD_TEMPLATES[name] for name in template_names],
+            axis=1
+        )  # (12, n_chords)
+
+        sims = chroma_norm.T @ template_matrix  # (n_frames, n_chords)
+        best_idx = np.argmax(sims, axis=1)
+        best_scores = sims[np.arange(sims.shape[0]), best_idx]
+
+        chord_labels = []
+        for score, idx in zip(best_scores, best_idx):
+            if score < chord_threshold:
+                chord_labels.append('N')
+            else:
+                chord_labels.append(template_names[idx])
+
+        # 5. Frames -> times
+        times = librosa.frames_to_time(
+            np.arange(len(chord_labels)),
+            sr=sr,
+            hop_length=hop_length
+        )
+
+        # 6. Group consecutive chords
+        chords = []
+        if len(chord_labels) > 0:
+            last_chord = chord_labels[0]
+            start_t = float(times[0])
+
+            for i in range(1, len(chord_labels)):
+                if chord_labels[i] != last_chord:
+                    if last_chord != 'N':
+                        chords.append({
+                            "start_time": float(start_t),
+                            "end_time": float(times[i]),
+                            "chord_name": last_chord
+                        })
+                    last_chord = chord_labels[i]
+                    start_t = float(times[i])
+
+            if last_chord != 'N':
+                chords.append({
+                    "start_time": float(start_t),
+                    "end_time": float(times[-1]),
+                    "chord_name": last_chord
+                })
+
+        # 7. Smooth: enforce minimum duration
+        chords = _enforce_min_duration(chords, min_chord_duration)
+
+        return chords
+
+    except Exception as e:
+        # Show the real error in your console/logs
+        import traceback
+        traceback.print_exc()
+        return [{"error": f"Chord detection error: {str(e)}"}]
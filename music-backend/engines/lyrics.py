@@ -0,0 +1,105 @@
+import os
+import time
+import json
+import google.generativeai as genai
+
+
+def analyze_lyrics(file_path, artist=None, title=None):
+    """
+    Analyzes lyrics by transcribing audio directly using the Gemini API.
+    Returns: A dictionary with 'lyrics_lines' and 'chords': None.
+    """
+    gemini_api_key = os.environ.get("GEMINI_API_KEY")
+    if not gemini_api_key:
+        print("--- [WARN] GEMINI_API_KEY not set. Cannot perform lyric analysis. ---")
+        return {"lyrics_lines": [], "chords": None}
+
+    try:
+        genai.configure(api_key=gemini_api_key)
+        
+        print(f"--- [INFO] Uploading {file_path} to Gemini for lyric analysis... ---")
+        audio_file = genai.upload_file(path=file_path)
+        
+        # Wait for the file to be processed. This is a good practice for large files.
+        while audio_file.state.name == "PROCESSING":
+            print("... waiting for Gemini file processing...")
+            time.sleep(10)
+        
+        if audio_file.state.name == "FAILED":
+            print(f"--- [ERROR] Gemini file processing failed for {file_path}. ---")
+            return {"lyrics_lines": [], "chords": None}
+        
+        print("--- [INFO] File uploaded. Transcribing with Gemini 2.5 Flash... ---")
+        model = genai.GenerativeModel('gemini-2.5-flash')
+
+        prompt = (
+            "You are a highly specialized AI for music transcription, tasked with creating perfectly synchronized, time-aligned lyric data for a music application. Your output is machine-read, so precision and strict adherence to the format are paramount.\n\n"
+            "**Your Task:**\n"
+            "Listen to the provided audio file and generate a precise, time-aligned transcription of the lyrics for the ENTIRE song.\n\n"
+            "**Output Requirements (Strictly Enforced):**\n"
+            "1.  **Format:** Your entire response MUST be a single, valid JSON array of objects. Do NOT include any surrounding text, explanations, or markdown code fences (like ```json). Just the raw JSON array.\n"
+            "2.  **Object Structure:** Each object in the array represents a single lyric line or instrumental segment and MUST contain three keys:\n"
+            "    - `start`: The start time of the segment in seconds (float).\n"
+            "    - `end`: The end time of the segment in seconds (float).\n"
+            "    - `text`: The transcribed lyric text for the segment (string).\n"
+            "3.  **Synchronization:** Timestamps (`start` and `end`) must be perfectly synchronized with the vocals in the audio. This is the most critical requirement.\n"
+            "4.  **Contiguous Timeline:** The timeline must be complete and have no gaps. For any section without vocals (intros, outros, instrumental solos, long pauses), you MUST generate a segment with the text set to `'[Instrumental]'`.\n"
+            "5.  **Language:** If the lyrics are not in English, provide a romanized (Roman English alphabet) transcription.\n"
+            "6.  **Unintelligible Vocals:** If a word or phrase is completely unintelligible, use `[unintelligible]` in the text.\n\n"
+            "**Example of a valid output snippet:**\n"
+            "[\n"
+            "  { \"start\": 0.0, \"end\": 10.5, \"text\": \"[Instrumental]\" },\n"
+            "  { \"start\": 10.5, \"end\": 14.2, \"text\": \"Hello, is there anybody in there?\" },\n"
+            "  { \"start\": 14.2, \"end\": 18.0, \"text\": \"Just nod if you can hear me.\" },\n"
+            "  { \"start\": 18.0, \"end\": 19.5, \"text\": \"Is there anyone at home?\" }\n"
+            "]"
+        )
+
+        response = model.generate_content([prompt, audio_file])
+        
+        # Clean the response to extract only the JSON part
+        response_text = response.text.strip()
+        json_start = response_text.find('[')
+        json_end = response_text.rfind(']') + 1
+        
+        if json_start == -1 or json_end == 0:
+            print(f"--- [ERROR] Gemini did not return a valid JSON array. Response: {response_text}")
+            return {"lyrics_lines": [], "chords": None}
+            
+        json_string = response_text[json_start:json_end]
+        
+        try:
+            lyrics_lines = json.loads(json_string)
+        except json.JSONDecodeError:
+            print(f"--- [ERROR] Failed to decode JSON from Gemini response. Response: {json_string}")
+            return {"lyrics_lines": [], "chords": None}
+        
+        # --- Robust Validation of the returned structure ---
+        if not isinstance(lyrics_lines, list):
+            print(f"--- [ERROR] Gemini returned JSON that is not a list. Response: {json_string}")
+            return {"lyrics_lines": [], "chords": None}
+
+        validated_lines = []
+        for line in lyrics_lines:
+            if (isinstance(line, dict) and
+                'start' in line and isinstance(line['start'], (int, float)) and
+                'end' in line and isinstance(line['end'], (int, float)) and
+                'text' in line and isinstance(line['text'], str)):
+                validated_lines.append(line)
+            else:
+                print(f"--- [WARN] Skipping malformed lyric line from Gemini: {line}")
+        
+        if not validated_lines:
+            print(f"--- [ERROR] Gemini response contained no valid lyric lines after validation.")
+            return {"lyrics_lines": [], "chords": None}
+
+        print(f"--- [INFO] Gemini transcription successful. Found {len(validated_lines)} valid lines. ---")
+        
+        # The caller expects chords to be None to trigger fallback chord analysis.
+        return {"lyrics_lines": validated_lines, "chords": None}
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"--- [ERROR] An error occurred during Gemini lyric analysis: {e}")
+        return {"lyrics_lines": [], "chords": None}
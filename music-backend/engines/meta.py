@@ -0,0 +1,85 @@
+import os
+import librosa
+import numpy as np
+import mutagen
+
+
+def analyze_meta(file_path, original_filename=None):
+    """Extracts high-level metadata: BPM, Key, Loudness, etc."""
+    # Load a 60-second mono segment for efficient analysis
+    y, sr = librosa.load(file_path, duration=60) 
+
+    # 1. Get BPM (Tempo)
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    
+    # 2. Get Key and Mode (e.g., C# minor)
+    # This is an advanced template-matching method for key detection.
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+    song_chroma_profile = np.sum(chroma, axis=1)
+
+    # Define standard templates for major and minor keys (Krumhansl-Schmuckler profiles)
+    major_template = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+    minor_template = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+    notes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    best_score = -1
+    estimated_key = "N/A"
+
+    # Correlate the song's profile with all 24 possible key templates
+    for i in range(12):
+        # Test against major template for the current root note
+        rotated_major_template = np.roll(major_template, i)
+        major_score = np.corrcoef(song_chroma_profile, rotated_major_template)[0, 1]
+        if major_score > best_score:
+            best_score = major_score
+            estimated_key = f"{notes[i]} major"
+
+        # Test against minor template for the current root note
+        rotated_minor_template = np.roll(minor_template, i)
+        minor_score = np.corrcoef(song_chroma_profile, rotated_minor_template)[0, 1]
+        if minor_score > best_score:
+            best_score = minor_score
+            estimated_key = f"{notes[i]} minor"
+
+    # 3. Get average loudness (RMS)
+    # This was missing from the previous version, causing an error.
+    rms = librosa.feature.rms(y=y)
+    avg_rms = float(np.mean(rms))
+    
+    # 4. Get average spectral centroid (brightness)
+    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
+    avg_spectral_centroid = float(np.mean(spectral_centroid))
+
+    # 5. Extract metadata tags (Artist, Title) using mutagen
+    artist = None
+    title = None
+    try:
+        audio_tags = mutagen.File(file_path, easy=True)
+        if audio_tags:
+            artist = audio_tags.get('artist', [None])[0]
+            title = audio_tags.get('title', [None])[0]
+    except Exception as e:
+        print(f"--- [WARN] Could not read metadata tags with mutagen: {e}")
+
+    # Fallback to filename parsing if tags are missing
+    if not artist or not title:
+        print("--- [INFO] Trying to parse artist/title from filename. ---")
+        # Uploads are stored under a per-task name; parse the client's name.
+        filename = os.path.basename(original_filename or file_path)
+        # A common format is "Artist - Title.mp3"
+        if ' - ' in filename:
+            try:
+                parts = filename.rsplit('.', 1)[0].split(' - ', 1)
+                if not artist: artist = parts[0].strip()
+                if not title: title = parts[1].strip()
+            except Exception: pass
+
+    return {
+        "bpm": round(float(tempo), 2), # Force float conversion
+        "duration_seconds": float(librosa.get_duration(path=file_path)), # Get duration of the full file
+        "estimated_key": estimated_key,
+        "loudness_rms": round(avg_rms, 4),
+        "brightness_spectral_centroid": round(avg_spectral_centroid, 2),
+        "artist": artist,
+        "title": title
+    }
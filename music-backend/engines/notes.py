@@ -0,0 +1,55 @@
+import os
+from basic_pitch.inference import predict
+import stem_store
+
+
+# Basic Pitch resamples its input to this rate.
+BASIC_PITCH_SAMPLE_RATE = 22050
+
+
+def analyze_notes_for_stems(stems_dict, store=None):
+    """
+    Runs note detection on all relevant stems (excluding drums) and returns a
+    dictionary of the results. With a StemStore, Basic Pitch reads the
+    pre-resampled mono copies instead of decoding and resampling each stem.
+    """
+    all_notes = {}
+    
+    # Melodic/harmonic stems analyzed for notes (the stem store only
+    # resamples these)
+    for stem_name in stem_store.ANALYSIS_STEMS:
+        if store is not None and stem_name in store:
+            print(f"--- [Internal] Analyzing notes for '{stem_name}' stem (stem store) ---")
+            all_notes[stem_name] = analyze_notes_basic_pitch(store.path(stem_name, BASIC_PITCH_SAMPLE_RATE))
+        elif stem_name in stems_dict and os.path.exists(stems_dict[stem_name]):
+            print(f"--- [Internal] Analyzing notes for '{stem_name}' stem ---")
+            # This reuses the existing single-file analysis function
+            notes = analyze_notes_basic_pitch(stems_dict[stem_name])
+            all_notes[stem_name] = notes
+        else:
+            print(f"--- [WARN] Stem '{stem_name}' not found or file is missing. Skipping note analysis. ---")
+            all_notes[stem_name] = [] # Return empty list for missing stems
+            
+    return all_notes
+
+def analyze_notes_basic_pitch(file_path):
+    """
+    Uses Spotify's Basic Pitch to detect MIDI notes.
+    """
+    try:
+        # predict returns: model_output, midi_data, note_events
+        _, _, note_events = predict(file_path)
+        
+        notes_json = []
+        for note in note_events:
+            # CRITICAL FIX: Cast numpy types to Python native types
+            notes_json.append({
+                "start": float(note[0]),
+                "end": float(note[1]),
+                "pitch": int(note[2]),    # Cast numpy.int64 to int
+                "velocity": float(note[3]) # Cast numpy.float32 to float
+            })
+        return notes_json
+    except Exception as e:
+        print(f"Error in Basic Pitch: {e}")
+        return []
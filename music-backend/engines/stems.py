@@ -0,0 +1,29 @@
+import os
+import subprocess
+
+
+def separate_stems(file_path, output_dir):
+    """
+    Calls Demucs to perform a 6-stem separation using the htdemucs_6s model.
+    This model separates audio into: vocals, bass, drums, piano, guitar, and other.
+    """
+    filename_base = os.path.basename(file_path).split('.')[0]
+    model_6s = "htdemucs_6s"
+    print(f"Starting Demucs 6-stem separation ({model_6s}) for {file_path}...")
+    command_6s = ["demucs", "-n", model_6s, "--out", output_dir, file_path]
+    subprocess.run(command_6s, check=True)
+
+    print("Stem separation complete.")
+
+    # Define path to the output directory of the model
+    path_6s = os.path.join(output_dir, model_6s, filename_base)
+    
+    # Create a dictionary pointing to each separated stem file.
+    return {
+        "vocals": os.path.join(path_6s, "vocals.wav"),
+        "bass": os.path.join(path_6s, "bass.wav"),
+        "drums": os.path.join(path_6s, "drums.wav"),
+        "piano": os.path.join(path_6s, "piano.wav"),
+        "guitar": os.path.join(path_6s, "guitar.wav"),
+        "other": os.path.join(path_6s, "other.wav"),
+    }
@@ -0,0 +1,427 @@
+import os
+import json
+import hashlib
+import tempfile
+
+
+# Formats that can be requested through /files/exports/<task_id>/<name>.<ext>
+# Maps the file extension to the renderer that produces it.
+EXPORT_FORMATS = {
+    "docx": "render_docx",
+    "pdf": "render_pdf",
+    "cho": "render_chordpro",
+    "txt": "render_text",
+    "mid": "render_midi",
+}
+
+EXPORTS_DIRNAME = "exports"
+
+# Upper bound for all cached export artifacts across every song in results/.
+# Least recently used artifacts are evicted once this is exceeded.
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# General MIDI programs used for each stem in the MIDI export.
+STEM_PROGRAMS = {
+    "vocals": 53,   # Voice Oohs
+    "bass": 33,     # Electric Bass (finger)
+    "piano": 0,     # Acoustic Grand Piano
+    "guitar": 25,   # Acoustic Guitar (steel)
+    "other": 48,    # String Ensemble 1
+}
+
+
+def result_version(result):
+    """
+    Returns a short, stable hash of the parts of a task result that exports
+    are rendered from. A re-analysis that changes lyrics, chords or notes gets
+    a new version, so stale artifacts are never served.
+    """
+    payload = {
+        "song_id": result.get("song_id"),
+        "title": (result.get("metadata") or {}).get("title"),
+        "lyrics_data": result.get("lyrics_data") or [],
+        "chords": result.get("chords") or [],
+        "notes": result.get("notes") or {},
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+# Formats rendered from the merged lyric/chord sheet; MIDI is rendered from notes.
+SHEET_FORMATS = ("docx", "pdf", "cho", "txt")
+
+
+def export_paths(task_id, song_id, has_sheet=True, has_notes=True):
+    """
+    Returns the /files paths for the export formats a task has content for:
+    sheet formats when lyrics were merged with chords, MIDI when some stem
+    has notes. Nothing is rendered here; the files are produced when first
+    requested.
+    """
+    formats = [ext for ext in EXPORT_FORMATS if (has_sheet if ext in SHEET_FORMATS else has_notes)]
+    return {
+        ext: f"{EXPORTS_DIRNAME}/{task_id}/{song_id}.{ext}"
+        for ext in formats
+    }
+
+
+def export_version(result):
+    """
+    Version of a task result's exports. Computed once by the analysis task
+    and stored in result["exports"]["version"], so serving a download never
+    hashes the result; older results without it are hashed here.
+    """
+    return (result.get("exports") or {}).get("version") or result_version(result)
+
+
+def _export_path(result, fmt, results_root):
+    song_id = result.get("song_id") or "song"
+    return os.path.join(results_root, song_id, EXPORTS_DIRNAME, export_version(result), f"{song_id}.{fmt}")
+
+
+def cached_export(result, fmt, results_root="results"):
+    """
+    Returns the path of an already rendered export (touching it for LRU
+    eviction), or None. Only uses the standard library, so the API can check
+    the cache without loading any renderer.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    path = _export_path(result, fmt, results_root)
+    try:
+        os.utime(path, None)
+    except OSError:
+        return None
+    return path
+
+
+def get_export(result, fmt, results_root="results"):
+    """
+    Returns the path of the rendered export for a task result, rendering it
+    on a cache miss. Artifacts are stored under
+    results/<song_id>/exports/<version>/ and are touched on every hit so that
+    eviction removes the least recently downloaded ones first.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    output_path = _export_path(result, fmt, results_root)
+    if cached_export(result, fmt, results_root) is not None:
+        return output_path
+
+    song_id = result.get("song_id") or "song"
+    version = export_version(result)
+    cache_dir = os.path.dirname(output_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    renderer = globals()[EXPORT_FORMATS[fmt]]
+
+    # Render to a temporary file first so that a concurrent request never
+    # streams a half-written artifact.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=f".{fmt}.part")
+    os.close(fd)
+    try:
+        renderer(result, tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    print(f"--- [INFO] Rendered {fmt} export for '{song_id}' (version {version}) ---")
+    evict_exports(results_root, keep=output_path)
+    return output_path
+
+
+def evict_exports(results_root="results", max_bytes=None, keep=None):
+    """
+    Deletes the least recently used export artifacts until the total size of
+    the export cache is below max_bytes. Empty version directories are removed.
+    """
+    if max_bytes is None:
+        max_bytes = EXPORT_CACHE_MAX_BYTES
+    if not os.path.isdir(results_root):
+        return 0
+
+    entries = []
+    total = 0
+    for song_id in os.listdir(results_root):
+        exports_dir = os.path.join(results_root, song_id, EXPORTS_DIRNAME)
+        if not os.path.isdir(exports_dir):
+            continue
+        for dirpath, _, filenames in os.walk(exports_dir):
+            for name in filenames:
+                # In-flight renders of other requests; they are renamed into
+                # place (or removed) by their own get_export call.
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+    removed = 0
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        # Another process may remove the directory or start a render in it
+        # concurrently; a leftover empty directory is harmless.
+        try:
+            parent = os.path.dirname(path)
+            if not os.listdir(parent):
+                os.rmdir(parent)
+        except OSError:
+            pass
+
+    if removed:
+        print(f"--- [INFO] Evicted {removed} cached export(s) ---")
+    return removed
+
+
+def _song_title(result):
+    meta = result.get("metadata") or {}
+    if meta.get("title") and meta.get("artist"):
+        return f"{meta['artist']} - {meta['title']}"
+    return meta.get("title") or result.get("song_id") or "Untitled"
+
+
+def _chord_line(item):
+    """
+    Builds the chord line printed above a lyric line, with every chord change
+    placed at its character offset. Falls back to the chord at the line start.
+    """
+    changes = item.get("chords")
+    if not changes:
+        return item.get("chord", "N")
+
+    line = ""
+    for change in changes:
+        # Keep at least one space between consecutive chord names.
+        col = max(change["offset"], len(line) + 1 if line else 0)
+        line = line.ljust(col) + change["chord"]
+    return line
+
+
+def _sheet_lines(result):
+    """Yields (chord line, text) pairs for every lyric line of a result."""
+    for item in result.get("lyrics_data") or []:
+        yield _chord_line(item), item.get("text", "")
+
+
+def _chordpro_line(item):
+    """Inlines every chord change of a lyric line as [Chord] at its offset."""
+    text = item.get("text", "")
+    changes = item.get("chords")
+    if changes is None:
+        chord = item.get("chord")
+        changes = [{"chord": chord, "offset": 0}] if chord and chord != "N" else []
+
+    # Insert from the end so earlier offsets stay valid.
+    for change in sorted(changes, key=lambda c: c["offset"], reverse=True):
+        if change["chord"] == "N":
+            continue
+        offset = min(change["offset"], len(text))
+        text = f"{text[:offset]}[{change['chord']}]{text[offset:]}"
+    return text
+
+
+def render_docx(result, output_path):
+    """
+    Creates a .docx file with chords placed above the lyrics.
+    """
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(_song_title(result), level=1)
+    doc.add_paragraph() # Add some space
+
+    p = doc.add_paragraph()
+    for chord, text in _sheet_lines(result):
+        chord_run = p.add_run(f"{chord}\n")
+        chord_run.bold = True
+        chord_run.font.name = 'Courier New'
+        lyric_run = p.add_run(f"{text}\n\n")
+        lyric_run.font.name = 'Courier New'
+
+    doc.save(output_path)
+    return output_path
+
+
+# Monospaced TTF fonts for the PDF export, first match wins. The chord line is
+# aligned to lyric characters, so the font must be monospaced; GNU FreeMono
+# also covers Devanagari and most other scripts Gemini may return.
+PDF_FONT_CANDIDATES = [
+    (os.environ.get("PDF_FONT_PATH"), os.environ.get("PDF_FONT_BOLD_PATH")),
+    ("/usr/share/fonts/truetype/freefont/FreeMono.ttf",
+     "/usr/share/fonts/truetype/freefont/FreeMonoBold.ttf"),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf",
+     "/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf"),
+]
+PDF_FONT_SIZE = 11
+PDF_MIN_FONT_SIZE = 8
+
+
+def _register_pdf_fonts():
+    """
+    Registers the first available Unicode TTF font with reportlab and returns
+    (regular, bold) font names. Falls back to the Latin-1 only Courier.
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    for regular, bold in PDF_FONT_CANDIDATES:
+        if not regular or not os.path.exists(regular):
+            continue
+        if "SheetMono" not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont("SheetMono", regular))
+            bold = bold if bold and os.path.exists(bold) else regular
+            pdfmetrics.registerFont(TTFont("SheetMono-Bold", bold))
+        return "SheetMono", "SheetMono-Bold"
+
+    print("--- [WARN] No Unicode TTF font found for PDF export; non Latin-1 lyrics will not render. ---")
+    return "Courier", "Courier-Bold"
+
+
+def _wrap_sheet_line(chord, text, max_chars):
+    """
+    Splits a chord line and its lyric line at the same columns so chords stay
+    above their syllables. Prefers breaking after a space in the lyrics and
+    never cuts through a chord name.
+    """
+    pairs = []
+    while len(text) > max_chars or len(chord) > max_chars:
+        col = text.rfind(" ", 0, max_chars) + 1
+        if col < max_chars // 2:
+            col = max_chars
+        while 0 < col < len(chord) and chord[col - 1] != " " and chord[col] != " ":
+            col -= 1
+        if col == 0:
+            col = max_chars
+        pairs.append((chord[:col].rstrip(), text[:col]))
+        chord, text = chord[col:], text[col:]
+    pairs.append((chord, text))
+    return pairs
+
+
+def render_pdf(result, output_path):
+    """
+    Creates a PDF lyric sheet with chords placed above the lyrics.
+    Long lines are shrunk down to PDF_MIN_FONT_SIZE and then wrapped.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+
+    regular, bold = _register_pdf_fonts()
+    width, height = A4
+    margin = 50
+    usable = width - 2 * margin
+    lines = list(_sheet_lines(result))
+
+    # Monospaced: every character has the width of "M".
+    longest = max([max(len(ch), len(tx)) for ch, tx in lines] or [1])
+    size = PDF_FONT_SIZE
+    while size > PDF_MIN_FONT_SIZE and longest * stringWidth("M", regular, size) > usable:
+        size -= 0.5
+    max_chars = max(1, int(usable // stringWidth("M", regular, size)))
+    leading = size * 1.3
+
+    c = canvas.Canvas(output_path, pagesize=A4)
+    title = _song_title(result)
+    title_size = 16
+    while title_size > PDF_MIN_FONT_SIZE and stringWidth(title, bold, title_size) > usable:
+        title_size -= 1
+    c.setFont(bold, title_size)
+    c.drawString(margin, height - margin, title)
+    y = height - margin - 36
+
+    for chord, text in lines:
+        for chord_part, text_part in _wrap_sheet_line(chord, text, max_chars):
+            if y < margin + 2 * leading:
+                c.showPage()
+                y = height - margin
+            c.setFont(bold, size)
+            c.drawString(margin, y, chord_part)
+            c.setFont(regular, size)
+            c.drawString(margin, y - leading, text_part)
+            y -= 2 * leading
+        y -= leading
+
+    c.save()
+    return output_path
+
+
+def render_chordpro(result, output_path):
+    """
+    Creates a ChordPro (.cho) file with the chords inlined in the lyrics.
+    """
+    lines = [f"{{title: {_song_title(result)}}}"]
+    meta = result.get("metadata") or {}
+    if meta.get("estimated_key"):
+        lines.append(f"{{key: {meta['estimated_key']}}}")
+    if meta.get("bpm"):
+        lines.append(f"{{tempo: {meta['bpm']}}}")
+    lines.append("")
+
+    for item in result.get("lyrics_data") or []:
+        lines.append(_chordpro_line(item))
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return output_path
+
+
+def render_text(result, output_path):
+    """
+    Creates a plain text lyric sheet with chords placed above the lyrics.
+    """
+    lines = [_song_title(result), ""]
+    for chord, text in _sheet_lines(result):
+        lines.append(chord)
+        lines.append(text)
+        lines.append("")
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return output_path
+
+
+def render_midi(result, output_path):
+    """
+    Creates a multi-track MIDI file from the detected notes, one track per stem.
+    """
+    import pretty_midi
+
+    bpm = (result.get("metadata") or {}).get("bpm") or 120.0
+    pm = pretty_midi.PrettyMIDI(initial_tempo=float(bpm))
+
+    for stem_name, notes in (result.get("notes") or {}).items():
+        if not notes:
+            continue
+        instrument = pretty_midi.Instrument(
+            program=STEM_PROGRAMS.get(stem_name, 0),
+            name=stem_name,
+        )
+        for note in notes:
+            # Basic Pitch reports amplitude in [0, 1]; MIDI velocity is 1..127.
+            velocity = int(round(float(note.get("velocity", 0.8)) * 127))
+            instrument.notes.append(pretty_midi.Note(
+                velocity=max(1, min(127, velocity)),
+                pitch=int(note["pitch"]),
+                start=float(note["start"]),
+                end=float(note["end"]),
+            ))
+        pm.instruments.append(instrument)
+
+    pm.write(output_path)
+    return output_path
@@ -0,0 +1,322 @@
+"""
+Harmonic fingerprints and a persistent nearest-neighbour index over them.
+
+A fingerprint is a compact, key-transposition-invariant vector built from
+  * the beat-synchronous chroma rotated to the track's tonic: the mean pitch
+    class profile and the beat-to-beat chroma transition matrix, and
+  * chord n-grams written as root intervals + qualities, feature-hashed.
+Two tracks are compared by cosine similarity of their fingerprints.
+
+The index stores fingerprints in SQLite (shared by the API and the workers
+through the results volume) together with random-hyperplane LSH signatures.
+Each of INDEX_TABLES signature columns is indexed, so a query only reads the
+rows in its buckets (plus neighbouring buckets, multi-probe) and re-ranks
+those candidates exactly instead of scanning the catalog.
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+
+import numpy as np
+
+
+NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+_FLATS = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#'}
+
+NGRAM_SIZES = (2, 3)
+NGRAM_DIMS = 256
+FINGERPRINT_DIMS = 12 + 144 + NGRAM_DIMS
+
+# Relative weight of each block in the final vector.
+PROFILE_WEIGHT = 0.5
+TRANSITION_WEIGHT = 1.0
+NGRAM_WEIGHT = 1.0
+
+HARMONIC_INDEX_PATH = os.environ.get(
+    'HARMONIC_INDEX_PATH', os.path.join('results', 'harmonic_index.sqlite')
+)
+INDEX_TABLES = 16
+INDEX_BITS = 12
+INDEX_SEED = 1729
+
+# Near-duplicate uploads: nearly identical harmony and length.
+DUPLICATE_SIMILARITY = float(os.environ.get('DUPLICATE_SIMILARITY', 0.97))
+DUPLICATE_MAX_DURATION_DIFF = float(os.environ.get('DUPLICATE_MAX_DURATION_DIFF', 3.0))
+
+
+def parse_chord(name):
+    """Splits a chord name into (root pitch class, quality), or None for 'N'/unknown."""
+    if not name or name == 'N':
+        return None
+    root_len = 2 if name[1:2] in ('#', 'b') else 1
+    root = _FLATS.get(name[:root_len], name[:root_len])
+    if root not in NOTES:
+        return None
+    return NOTES.index(root), name[root_len:]
+
+
+def tonic_from_key(estimated_key):
+    """Returns the pitch class of a key string like 'C# minor', or None."""
+    if not estimated_key:
+        return None
+    parsed = parse_chord(estimated_key.split(' ')[0])
+    return parsed[0] if parsed else None
+
+
+def chord_ngrams(chords, sizes=NGRAM_SIZES):
+    """
+    Yields transposition-invariant chord n-grams: each chord is written as
+    (interval from the first chord's root, quality). Repeated chords and
+    no-chord segments are collapsed first.
+    """
+    seq = []
+    for c in chords or []:
+        parsed = parse_chord(c.get('chord_name'))
+        if parsed and (not seq or seq[-1] != parsed):
+            seq.append(parsed)
+
+    for n in sizes:
+        for i in range(len(seq) - n + 1):
+            first_root = seq[i][0]
+            yield tuple(((root - first_root) % 12, quality) for root, quality in seq[i:i + n])
+
+
+def _unit(v):
+    n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+def compute_fingerprint(chords, beat_chroma=None, estimated_key=None):
+    """
+    Builds the fingerprint vector (float32, FINGERPRINT_DIMS) of a track from
+    its chord segments and, when available, its beat-synchronous chroma.
+    Returns None if there is no harmonic content to describe.
+    """
+    profile = np.zeros(12)
+    transitions = np.zeros((12, 12))
+    if beat_chroma is not None and np.size(beat_chroma):
+        chroma = np.asarray(beat_chroma, dtype=np.float64)
+        chroma = chroma / (np.linalg.norm(chroma, axis=0, keepdims=True) + 1e-8)
+        profile = chroma.mean(axis=1)
+
+        # Rotate so the tonic is pitch class 0 (transposition invariance).
+        tonic = tonic_from_key(estimated_key)
+        if tonic is None:
+            tonic = int(np.argmax(profile))
+        chroma = np.roll(chroma, -tonic, axis=0)
+        profile = np.roll(profile, -tonic)
+        if chroma.shape[1] > 1:
+            transitions = chroma[:, :-1] @ chroma[:, 1:].T
+
+    ngrams = np.zeros(NGRAM_DIMS)
+    for gram in chord_ngrams(chords):
+        ngrams[zlib.crc32(repr(gram).encode('utf-8')) % NGRAM_DIMS] += 1.0
+    ngrams = np.sqrt(ngrams)
+
+    if not profile.any() and not ngrams.any():
+        return None
+
+    vec = np.concatenate([
+        PROFILE_WEIGHT * _unit(profile),
+        TRANSITION_WEIGHT * _unit(transitions.ravel()),
+        NGRAM_WEIGHT * _unit(ngrams),
+    ])
+    return _unit(vec).astype(np.float32)
+
+
+class HarmonicIndex:
+    """
+    Persistent LSH index of track fingerprints.
+
+    Safe to open from several processes: SQLite serializes writers, and the
+    hyperplanes are derived from the seed stored with the index. The schema
+    and hyperplanes are set up once per instance; each thread using the
+    instance gets its own connection (see shared_index()).
+    """
+
+    def __init__(self, path=None, tables=INDEX_TABLES, bits=INDEX_BITS, seed=INDEX_SEED):
+        self.path = path or HARMONIC_INDEX_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()
+        if row:
+            params = json.loads(row[0])
+        else:
+            params = {'dims': FINGERPRINT_DIMS, 'tables': tables, 'bits': bits, 'seed': seed}
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('params', ?)", (json.dumps(params),))
+        self.dims, self.tables, self.bits = params['dims'], params['tables'], params['bits']
+
+        rng = np.random.default_rng(params['seed'])
+        planes = rng.standard_normal((self.tables * self.bits, self.dims))
+        # Fingerprints are non-negative, so they all lie near the all-ones
+        # direction; hyperplanes containing it split the catalog evenly.
+        planes -= planes.mean(axis=1, keepdims=True)
+        self.planes = planes.astype(np.float32)
+        self._weights = (1 << np.arange(self.bits)).astype(np.int64)
+
+        sig_cols = ', '.join(f'sig{t} INTEGER' for t in range(self.tables))
+        self.conn.execute(f'''CREATE TABLE IF NOT EXISTS tracks (
+            task_id TEXT PRIMARY KEY,
+            song_id TEXT,
+            title TEXT,
+            artist TEXT,
+            estimated_key TEXT,
+            bpm REAL,
+            duration REAL,
+            added REAL,
+            vector BLOB,
+            {sig_cols})''')
+        for t in range(self.tables):
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS tracks_sig{t} ON tracks (sig{t})')
+        self.conn.commit()
+
+    @property
+    def conn(self):
+        """SQLite connection of the calling thread, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn
+
+    def close(self):
+        """Closes the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+
+    def _projections(self, vec):
+        return (self.planes @ vec).reshape(self.tables, self.bits)
+
+    def _signatures(self, projections):
+        return ((projections > 0).astype(np.int64) @ self._weights).tolist()
+
+    def add(self, task_id, vector, song_id=None, metadata=None):
+        """Inserts or replaces the fingerprint of a finished task."""
+        metadata = metadata or {}
+        vector = np.asarray(vector, dtype=np.float32)
+        sigs = self._signatures(self._projections(vector))
+        cols = ', '.join(f'sig{t}' for t in range(self.tables))
+        marks = ', '.join('?' for _ in range(9 + self.tables))
+        self.conn.execute(
+            f'INSERT OR REPLACE INTO tracks (task_id, song_id, title, artist, estimated_key, bpm, duration, added, vector, {cols}) '
+            f'VALUES ({marks})',
+            [task_id, song_id, metadata.get('title'), metadata.get('artist'),
+             metadata.get('estimated_key'), metadata.get('bpm'), metadata.get('duration_seconds'),
+             time.time(), vector.astype(np.float16).tobytes(), *sigs],
+        )
+        self.conn.commit()
+
+    def get_vector(self, task_id):
+        row = self.conn.execute('SELECT vector FROM tracks WHERE task_id = ?', (task_id,)).fetchone()
+        return np.frombuffer(row[0], dtype=np.float16).astype(np.float32) if row else None
+
+    def query(self, vector, k=10, probes=2, exclude=None):
+        """
+        Returns up to k nearest tracks as dicts (with 'similarity'), best first.
+        `probes` extra buckets per table are visited by flipping the bits whose
+        projections are closest to their hyperplane.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        projections = self._projections(vector)
+        base = self._signatures(projections)
+
+        clauses, params = [], []
+        for t in range(self.tables):
+            buckets = [base[t]]
+            for bit in np.argsort(np.abs(projections[t]))[:probes]:
+                buckets.append(base[t] ^ (1 << int(bit)))
+            clauses.append(f"sig{t} IN ({', '.join('?' for _ in buckets)})")
+            params.extend(buckets)
+
+        rows = self.conn.execute(
+            'SELECT task_id, song_id, title, artist, estimated_key, bpm, duration, vector '
+            f"FROM tracks WHERE {' OR '.join(clauses)}",
+            params,
+        ).fetchall()
+        rows = [r for r in rows if r[0] != exclude]
+        if not rows:
+            return []
+
+        candidates = np.stack([np.frombuffer(r[7], dtype=np.float16) for r in rows]).astype(np.float32)
+        sims = candidates @ vector
+        top = np.argsort(-sims)[:k]
+        return [
+            {
+                'task_id': rows[i][0],
+                'song_id': rows[i][1],
+                'title': rows[i][2],
+                'artist': rows[i][3],
+                'estimated_key': rows[i][4],
+                'bpm': rows[i][5],
+                'duration_seconds': rows[i][6],
+                'similarity': round(float(sims[i]), 4),
+            }
+            for i in top
+        ]
+
+    def similar_to(self, task_id, k=10, probes=2):
+        """Nearest tracks to an indexed task, or None if it is not indexed."""
+        vector = self.get_vector(task_id)
+        if vector is None:
+            return None
+        return self.query(vector, k=k, probes=probes, exclude=task_id)
+
+    def duplicates_of(self, task_id):
+        """Indexed tracks that look like re-uploads of the same recording."""
+        vector = self.get_vector(task_id)
+        if vector is None:
+            return None
+        row = self.conn.execute('SELECT duration FROM tracks WHERE task_id = ?', (task_id,)).fetchone()
+        duration = row[0] if row else None
+        matches = []
+        for m in self.query(vector, k=50, exclude=task_id):
+            if m['similarity'] < DUPLICATE_SIMILARITY:
+                break
+            if duration is not None and m['duration_seconds'] is not None and \
+                    abs(m['duration_seconds'] - duration) > DUPLICATE_MAX_DURATION_DIFF:
+                continue
+            matches.append(m)
+        return matches
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_index(path=None):
+    """
+    Returns the process-wide HarmonicIndex for path, creating it on first
+    use, so requests and tasks don't reopen the database and rebuild the
+    hyperplanes every time.
+    """
+    path = path or HARMONIC_INDEX_PATH
+    index = _shared.get(path)
+    if index is None:
+        with _shared_lock:
+            index = _shared.get(path)
+            if index is None:
+                index = _shared[path] = HarmonicIndex(path)
+    return index
+
+
+def index_track(task_id, song_id, chords, metadata, beat_chroma=None, path=None):
+    """
+    Computes the fingerprint of a finished task and adds it to the index.
+    Returns True if the track was indexed.
+    """
+    vector = compute_fingerprint(chords, beat_chroma, (metadata or {}).get('estimated_key'))
+    if vector is None:
+        return False
+    shared_index(path).add(task_id, vector, song_id=song_id, metadata=metadata)
+    return True
@@ -0,0 +1,347 @@
+"""
+Cost-aware scheduling of analysis jobs.
+
+Uploads are not sent to Celery directly. Each job gets an estimated cost
+(worker seconds) from the probed audio duration and the requested stages,
+is assigned to a size-class queue and waits in a Redis sorted set. A job is
+only handed to Celery when a worker slot of its queue is free, picking the
+job with the lowest aged cost first (shortest-job-first with aging).
+
+The aged cost of a waiting job is `cost - AGING_RATE * waited_seconds`. Since
+`waited_seconds = now - submitted`, ordering by `cost + AGING_RATE * submitted`
+is the same at every instant, so that value is stored as the sorted-set score
+and ZPOPMIN always yields the next job to run.
+
+Admission control rejects uploads when the estimated wait for a new job in
+its queue exceeds ADMISSION_MAX_WAIT_SECONDS.
+"""
+import os
+import json
+import time
+import heapq
+import subprocess
+import contextlib
+
+import redis
+from redis.exceptions import LockError
+from celery import states
+
+import task_signatures
+
+
+SCHEDULER_REDIS_URL = os.environ.get(
+    'SCHEDULER_REDIS_URL', task_signatures.CELERY_BROKER_URL
+)
+
+# Size classes: (queue name, max estimated cost in seconds). Checked in order.
+# With STAGE_COST below, the full pipeline costs about 44s + 2.1s per second
+# of audio. The defaults follow the uploads this app gets:
+#   short  <= 240s:  clips and previews up to ~1.5 min (the 1-minute sample in
+#                    uploads/ costs ~170s), and partial-stage jobs on songs,
+#   medium <= 1080s: full songs up to ~8 min (a 4-min song costs ~550s),
+#   long:            DJ mixes, live sets and other long recordings.
+# Jobs are never preempted, so each class has its own worker and a song
+# never waits behind an hour-long recording.
+QUEUE_CLASSES = [
+    ('analysis.short', float(os.environ.get('SCHEDULER_SHORT_MAX_COST', 240))),
+    ('analysis.medium', float(os.environ.get('SCHEDULER_MEDIUM_MAX_COST', 1080))),
+    ('analysis.long', float('inf')),
+]
+
+# Worker processes consuming each queue (must match the worker --concurrency).
+QUEUE_SLOTS = {
+    'analysis.short': int(os.environ.get('SCHEDULER_SLOTS_SHORT', 1)),
+    'analysis.medium': int(os.environ.get('SCHEDULER_SLOTS_MEDIUM', 1)),
+    'analysis.long': int(os.environ.get('SCHEDULER_SLOTS_LONG', 1)),
+}
+
+# Seconds of cost credited per second of waiting.
+AGING_RATE = float(os.environ.get('SCHEDULER_AGING_RATE', 0.5))
+
+# Reject new uploads whose estimated start is further away than this.
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', 3600))
+
+# Running jobs this long past their estimated end are assumed lost
+# (e.g. the worker was killed) and no longer hold a slot.
+STALE_RUNNING_SECONDS = float(os.environ.get('SCHEDULER_STALE_SECONDS', 3600))
+
+# How often each worker runs heartbeat() (see tasks.py).
+HEARTBEAT_SECONDS = float(os.environ.get('SCHEDULER_HEARTBEAT_SECONDS', 30))
+
+# Estimated worker seconds per second of audio for each stage, plus a fixed
+# overhead per stage. Rough CPU figures for the current pipeline.
+STAGE_COST = {
+    'meta': (0.05, 2.0),
+    'stems': (1.2, 10.0),     # Demucs htdemucs_6s
+    'notes': (0.6, 5.0),      # Basic Pitch over five stems
+    'lyrics': (0.1, 20.0),    # Gemini upload + transcription
+    'chords': (0.15, 2.0),
+}
+JOB_OVERHEAD_SECONDS = 5.0
+
+_LOCK_KEY = 'scheduler:lock'
+_JOB_KEY = 'scheduler:job:{}'
+_WAITING_KEY = 'scheduler:{}:waiting'
+_RUNNING_KEY = 'scheduler:{}:running'
+
+_redis = None
+
+
+class AdmissionRejected(Exception):
+    """Raised when the backlog is too large to accept a new job."""
+
+    def __init__(self, queue, estimated_start_seconds):
+        super().__init__(
+            f"Queue {queue} is full; estimated start in {estimated_start_seconds:.0f}s"
+        )
+        self.queue = queue
+        self.estimated_start_seconds = estimated_start_seconds
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(SCHEDULER_REDIS_URL, decode_responses=True)
+    return _redis
+
+
+@contextlib.contextmanager
+def _scheduler_lock(r):
+    """
+    Holds the scheduler lock. Raises LockError only if it could not be
+    acquired; if it expired while held (slow dispatch), the work done under
+    it is kept and the failed release is only logged.
+    """
+    lock = r.lock(_LOCK_KEY, timeout=10, blocking_timeout=10)
+    if not lock.acquire():
+        raise LockError("Could not acquire the scheduler lock")
+    try:
+        yield
+    finally:
+        try:
+            lock.release()
+        except LockError as e:
+            print(f"--- [WARN] Scheduler lock expired before release: {e}")
+
+
+def probe_duration(file_path):
+    """
+    Returns the duration of an audio file in seconds without decoding it.
+    Tries the container headers via mutagen first, then ffprobe.
+    """
+    try:
+        import mutagen
+        audio = mutagen.File(file_path)
+        if audio is not None and audio.info and audio.info.length:
+            return float(audio.info.length)
+    except Exception as e:
+        print(f"--- [WARN] mutagen could not probe {file_path}: {e}")
+
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", file_path],
+            check=True, capture_output=True, text=True, timeout=30,
+        )
+        return float(out.stdout.strip())
+    except Exception as e:
+        print(f"--- [WARN] ffprobe could not probe {file_path}: {e}")
+        return None
+
+
+def estimate_cost(duration_seconds, stages=None):
+    """
+    Estimates the worker time (seconds) of a job from its audio duration and
+    the stages it runs. Unknown durations are treated as long jobs.
+    """
+    stages = task_signatures.normalize_stages(stages)
+    if duration_seconds is None:
+        duration_seconds = float(os.environ.get('SCHEDULER_UNKNOWN_DURATION', 600))
+
+    cost = JOB_OVERHEAD_SECONDS
+    for stage in stages:
+        per_second, overhead = STAGE_COST[stage]
+        cost += per_second * duration_seconds + overhead
+    return cost
+
+
+def queue_for_cost(cost):
+    for queue, max_cost in QUEUE_CLASSES:
+        if cost <= max_cost:
+            return queue
+    return QUEUE_CLASSES[-1][0]
+
+
+def submit(task_id, file_path, original_filename, stages=None):
+    """
+    Admits an analysis job and dispatches it if its queue has a free slot.
+
+    Returns a dict with the queue, estimated cost and estimated start time.
+    Raises AdmissionRejected when the queue backlog is too large, and
+    LockError when the scheduler lock could not be acquired in time. In both
+    cases the job was not stored, so the caller may discard the upload.
+    """
+    stages = task_signatures.normalize_stages(stages)
+    duration = probe_duration(file_path)
+    cost = estimate_cost(duration, stages)
+    queue = queue_for_cost(cost)
+    now = time.time()
+    score = cost + AGING_RATE * now
+
+    r = get_redis()
+    with _scheduler_lock(r):
+        _drop_stale(r, queue, now)
+        estimated_start = _estimate_start(r, queue, score, now)
+        if estimated_start > ADMISSION_MAX_WAIT_SECONDS:
+            raise AdmissionRejected(queue, estimated_start)
+
+        r.hset(_JOB_KEY.format(task_id), mapping={
+            'queue': queue,
+            'cost': cost,
+            'duration': duration if duration is not None else '',
+            'submitted': now,
+            'file_path': file_path,
+            'original_filename': original_filename,
+            'stages': json.dumps(stages),
+        })
+        r.zadd(_WAITING_KEY.format(queue), {task_id: score})
+        _dispatch(r, queue, now)
+
+    return {
+        'queue': queue,
+        'estimated_cost_seconds': round(cost, 1),
+        'duration_seconds': duration,
+        'estimated_start_seconds': round(estimated_start, 1),
+    }
+
+
+def dispatch(queue=None):
+    """Hands waiting jobs to Celery while their queues have free slots."""
+    r = get_redis()
+    queues = [queue] if queue else [q for q, _ in QUEUE_CLASSES]
+    now = time.time()
+    with _scheduler_lock(r):
+        for q in queues:
+            _drop_stale(r, q, now)
+            _dispatch(r, q, now)
+
+
+def mark_started(task_id):
+    """Called by the worker when a job starts; refreshes its expected end."""
+    r = get_redis()
+    job = r.hgetall(_JOB_KEY.format(task_id))
+    if not job:
+        return
+    r.zadd(_RUNNING_KEY.format(job['queue']), {task_id: time.time() + float(job['cost'])})
+
+
+def mark_finished(task_id):
+    """Called by the worker when a job ends; frees its slot and dispatches."""
+    r = get_redis()
+    job = r.hgetall(_JOB_KEY.format(task_id))
+    if not job:
+        return
+    r.zrem(_RUNNING_KEY.format(job['queue']), task_id)
+    r.delete(_JOB_KEY.format(task_id))
+    dispatch(job['queue'])
+
+
+def heartbeat():
+    """
+    Periodic maintenance, run by every worker. Frees the slots of jobs that
+    ended without task_postrun (e.g. the worker process was killed and Celery
+    recorded a WorkerLostError) and dispatches waiting jobs, so the queues
+    keep moving even when no upload or finishing job triggers a dispatch.
+    """
+    r = get_redis()
+    for queue, _ in QUEUE_CLASSES:
+        for task_id in r.zrange(_RUNNING_KEY.format(queue), 0, -1):
+            if task_signatures.celery.AsyncResult(task_id).state in states.READY_STATES:
+                print(f"--- [WARN] Job {task_id} ended without releasing its slot in {queue}. Releasing it. ---")
+                r.zrem(_RUNNING_KEY.format(queue), task_id)
+                r.delete(_JOB_KEY.format(task_id))
+    dispatch()
+
+
+def cancel(task_id):
+    """Removes a job that has not been dispatched yet. Returns True if found."""
+    r = get_redis()
+    job = r.hgetall(_JOB_KEY.format(task_id))
+    if not job:
+        return False
+    removed = r.zrem(_WAITING_KEY.format(job['queue']), task_id)
+    r.zrem(_RUNNING_KEY.format(job['queue']), task_id)
+    r.delete(_JOB_KEY.format(task_id))
+    if not removed:
+        dispatch(job['queue'])
+    return bool(removed)
+
+
+def queue_status(task_id):
+    """
+    Returns the position and estimated start of a job still waiting in the
+    scheduler, or None if it has been dispatched (or is unknown).
+    """
+    r = get_redis()
+    job = r.hgetall(_JOB_KEY.format(task_id))
+    if not job:
+        return None
+    queue = job['queue']
+    score = r.zscore(_WAITING_KEY.format(queue), task_id)
+    if score is None:
+        return None
+    now = time.time()
+    return {
+        'queue': queue,
+        'position': r.zrank(_WAITING_KEY.format(queue), task_id) + 1,
+        'estimated_cost_seconds': round(float(job['cost']), 1),
+        'estimated_start_seconds': round(_estimate_start(r, queue, score, now, exclude=task_id), 1),
+    }
+
+
+def _dispatch(r, queue, now):
+    # Caller holds the scheduler lock.
+    free = QUEUE_SLOTS[queue] - r.zcard(_RUNNING_KEY.format(queue))
+    while free > 0:
+        popped = r.zpopmin(_WAITING_KEY.format(queue))
+        if not popped:
+            break
+        task_id, _ = popped[0]
+        job = r.hgetall(_JOB_KEY.format(task_id))
+        if not job:
+            continue
+        r.zadd(_RUNNING_KEY.format(queue), {task_id: now + float(job['cost'])})
+        task_signatures.analyze_audio(
+            job['file_path'],
+            job['original_filename'],
+            stages=json.loads(job['stages']),
+            task_id=task_id,
+            queue=queue,
+        )
+        free -= 1
+
+
+def _drop_stale(r, queue, now):
+    r.zremrangebyscore(_RUNNING_KEY.format(queue), '-inf', now - STALE_RUNNING_SECONDS)
+
+
+def _estimate_start(r, queue, score, now, exclude=None):
+    """
+    Simulates the queue: running jobs occupy their slots until their expected
+    end, then waiting jobs ahead of `score` are assigned to the earliest free
+    slot. Returns the seconds until a job with that score would start.
+    """
+    slots = [max(0.0, end - now) for _, end in r.zrange(_RUNNING_KEY.format(queue), 0, -1, withscores=True)]
+    slots += [0.0] * max(0, QUEUE_SLOTS[queue] - len(slots))
+    slots = sorted(slots)[:max(1, QUEUE_SLOTS[queue])]
+    heapq.heapify(slots)
+
+    ahead = r.zrangebyscore(_WAITING_KEY.format(queue), '-inf', score)
+    for task_id in ahead:
+        if task_id == exclude:
+            continue
+        cost = r.hget(_JOB_KEY.format(task_id), 'cost')
+        if cost is None:
+            continue
+        heapq.heappush(slots, heapq.heappop(slots) + float(cost))
+    return slots[0]
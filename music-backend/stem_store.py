@@ -0,0 +1,193 @@
+"""
+Intermediate store for separated stems, shared by the pipeline stages.
+
+Each stem is decoded once after separation and kept as raw sample arrays:
+
+  * a native copy at the separation rate, (frames, channels), float32 or
+    float16 (STEM_STORE_FLOAT16) in .npy format, and
+  * mono copies pre-resampled to each rate in ANALYSIS_RATES, stored as
+    float32 WAV with a fixed 44-byte header, so the data chunk can be
+    mapped directly with np.memmap.
+
+Current readers:
+  * write_renditions() derives the served 16-bit WAVs from the native copies
+    (read with load()), and
+  * note detection passes the 22050 Hz WAV paths to Basic Pitch (which only
+    accepts files) so it skips its own decode and resample.
+Chord detection and metadata still read the master file.
+"""
+import os
+import json
+import struct
+
+import numpy as np
+
+
+STORE_DIRNAME = "stem_store"
+MANIFEST_NAME = "manifest.json"
+
+# Rates the analyzers consume: Basic Pitch and librosa's default both use 22050 Hz.
+ANALYSIS_RATES = (22050,)
+
+# Stems that note detection reads; only these get the resampled copies.
+ANALYSIS_STEMS = ("vocals", "bass", "piano", "guitar", "other")
+
+STEM_STORE_FLOAT16 = os.environ.get("STEM_STORE_FLOAT16", "0") == "1"
+
+_WAV_HEADER_SIZE = 44
+_WAVE_FORMAT_IEEE_FLOAT = 3
+
+
+def _write_float_wav(path, mono, sr):
+    """Writes a mono float32 WAV whose samples start at byte 44."""
+    data = np.ascontiguousarray(mono, dtype="<f4")
+    n_bytes = data.nbytes
+    header = b"".join([
+        b"RIFF", struct.pack("<I", 36 + n_bytes), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, _WAVE_FORMAT_IEEE_FLOAT, 1, sr, sr * 4, 4, 32),
+        b"data", struct.pack("<I", n_bytes),
+    ])
+    with open(path, "wb") as f:
+        f.write(header)
+        data.tofile(f)
+
+
+class StemStore:
+    """Read/write access to the stem store of one song."""
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    @classmethod
+    def for_task(cls, work_dir):
+        """Store inside a task's work directory (see tasks._task_work_dir)."""
+        return cls(os.path.join(work_dir, STORE_DIRNAME))
+
+    def __contains__(self, stem):
+        return stem in self.manifest
+
+    def stems(self):
+        return list(self.manifest)
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def _entry(self, stem, sr=None):
+        entries = self.manifest.get(stem)
+        if not entries:
+            raise KeyError(f"Stem '{stem}' is not in the store")
+        key = "native" if sr is None else str(int(sr))
+        if key not in entries:
+            raise KeyError(f"Stem '{stem}' has no copy at {sr} Hz")
+        return entries[key]
+
+    def put(self, stem, samples, sr, rates=ANALYSIS_RATES, float16=None):
+        """
+        Stores a stem from its native (frames, channels) float array and
+        derives the mono copies for each analysis rate.
+        """
+        import librosa
+
+        if float16 is None:
+            float16 = STEM_STORE_FLOAT16
+        os.makedirs(self.root, exist_ok=True)
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+
+        entries = {}
+        native_file = f"{stem}.native.npy"
+        np.save(os.path.join(self.root, native_file), samples.astype(np.float16) if float16 else samples)
+        entries["native"] = {
+            "file": native_file,
+            "sr": int(sr),
+            "channels": int(samples.shape[1]),
+            "frames": int(samples.shape[0]),
+            "dtype": "float16" if float16 else "float32",
+        }
+
+        mono = samples.mean(axis=1)
+        for rate in rates:
+            resampled = mono if rate == sr else librosa.resample(mono, orig_sr=sr, target_sr=rate)
+            rate_file = f"{stem}.{rate}.wav"
+            _write_float_wav(os.path.join(self.root, rate_file), resampled, int(rate))
+            entries[str(int(rate))] = {
+                "file": rate_file,
+                "sr": int(rate),
+                "channels": 1,
+                "frames": int(resampled.shape[0]),
+                "dtype": "float32",
+            }
+
+        self.manifest[stem] = entries
+        self._save_manifest()
+
+    def load(self, stem, sr=None):
+        """
+        Returns a read-only memory-mapped array of a stem: the native
+        (frames, channels) copy when sr is None, else the mono copy at sr.
+        """
+        entry = self._entry(stem, sr)
+        path = os.path.join(self.root, entry["file"])
+        if path.endswith(".npy"):
+            return np.load(path, mmap_mode="r")
+        return np.memmap(path, dtype="<f4", mode="r", offset=_WAV_HEADER_SIZE, shape=(entry["frames"],))
+
+    def path(self, stem, sr):
+        """Path of the mono WAV copy at sr, for tools that only accept files."""
+        return os.path.join(self.root, self._entry(stem, sr)["file"])
+
+    def sample_rate(self, stem, sr=None):
+        return self._entry(stem, sr)["sr"]
+
+    def write_rendition(self, stem, output_path, subtype="PCM_16"):
+        """Writes a serving rendition (WAV) of a stem from its native copy."""
+        import soundfile as sf
+
+        entry = self._entry(stem)
+        # Another task for the same song may be serving or writing this file.
+        tmp_path = f"{output_path}.{os.getpid()}.part"
+        sf.write(tmp_path, np.asarray(self.load(stem), dtype=np.float32), entry["sr"],
+                 subtype=subtype, format="WAV")
+        os.replace(tmp_path, output_path)
+        return output_path
+
+
+def ingest(stems_dict, work_dir, rates=ANALYSIS_RATES):
+    """
+    Decodes every separated stem file once into the task's stem store.
+    Stems outside ANALYSIS_STEMS (drums) only get the native copy.
+    Returns the StemStore.
+    """
+    import soundfile as sf
+
+    store = StemStore.for_task(work_dir)
+    for stem, path in stems_dict.items():
+        if not path or not os.path.exists(path):
+            print(f"--- [WARN] Stem '{stem}' file is missing. Not adding it to the stem store. ---")
+            continue
+        samples, sr = sf.read(path, dtype="float32", always_2d=True)
+        store.put(stem, samples, sr, rates=rates if stem in ANALYSIS_STEMS else ())
+        print(f"--- [Internal] Stored '{stem}' stem ({samples.shape[0] / sr:.1f}s @ {sr} Hz) ---")
+    return store
+
+
+def write_renditions(store, output_dir, subtype="PCM_16"):
+    """
+    Derives the serving renditions (results/<song_id>/stems/<stem>.wav) from
+    the store. Returns {stem: path} for the API result.
+    """
+    renditions_dir = os.path.join(output_dir, "stems")
+    os.makedirs(renditions_dir, exist_ok=True)
+    return {
+        stem: store.write_rendition(stem, os.path.join(renditions_dir, f"{stem}.wav"), subtype=subtype)
+        for stem in store.stems()
+    }
@@ -0,0 +1,77 @@
+"""
+Lightweight Celery client shared by the API and the worker.
+
+The API only enqueues tasks and reads their results, so it sends tasks by
+name through this module instead of importing tasks.py (which pulls in the
+analysis stack). The worker registers the task implementations in tasks.py
+under the names defined here.
+"""
+import os
+from dotenv import load_dotenv
+from celery import Celery
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Config
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+
+celery = Celery('tasks', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+
+# Registered task names
+ANALYZE_AUDIO_TASK = 'tasks.analyze_audio_task'
+RENDER_EXPORT_TASK = 'tasks.render_export'
+
+# Exports are rendered by a dedicated worker so web workers stay free of
+# python-docx / reportlab / pretty_midi. A render requested by the API is
+# considered in progress for EXPORT_RENDER_TIMEOUT seconds; later requests
+# within that window don't enqueue it again.
+EXPORTS_QUEUE = 'exports'
+EXPORT_RENDER_TIMEOUT = int(os.environ.get('EXPORT_RENDER_TIMEOUT', 60))
+
+# Pipeline stages a client can request. Metadata always runs; notes need stems.
+STAGES = ('meta', 'stems', 'notes', 'lyrics', 'chords')
+
+
+def normalize_stages(stages=None):
+    """
+    Returns the ordered list of stages to run for a request.
+    None or empty means the full pipeline. Raises ValueError on unknown stages.
+    """
+    if not stages:
+        return list(STAGES)
+    if isinstance(stages, str):
+        stages = [s.strip() for s in stages.split(',') if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    requested = set(stages) | {'meta'}
+    if 'notes' in requested:
+        requested.add('stems')
+    return [s for s in STAGES if s in requested]
+
+
+def analyze_audio(file_path, original_filename, stages=None, **options):
+    """Enqueues the analysis pipeline for an uploaded file."""
+    return celery.send_task(
+        ANALYZE_AUDIO_TASK,
+        args=(file_path, original_filename),
+        kwargs={'stages': normalize_stages(stages)},
+        **options
+    )
+
+
+def export_render_id(task_id, fmt, version):
+    """Celery task id of the render of one export version."""
+    return f'export-{task_id}-{version}-{fmt}'
+
+
+def render_export(task_id, fmt, version):
+    """Asks the exports worker to render one export of a finished task."""
+    return celery.send_task(
+        RENDER_EXPORT_TASK,
+        args=(task_id, fmt),
+        task_id=export_render_id(task_id, fmt, version),
+        queue=EXPORTS_QUEUE,
+    )
@@ -1,23 +1,113 @@
 import os
-from dotenv import load_dotenv
-from celery import Celery
+import time
+import shutil
+import importlib
+import threading
+from celery.signals import worker_process_init, worker_ready, task_prerun, task_postrun
+from task_signatures import celery, ANALYZE_AUDIO_TASK, RENDER_EXPORT_TASK, normalize_stages
 import analyzer
+import exporter
+import aligner
+import scheduler
+import fingerprint
+import stem_store
 
-# Load environment variables from .env file for the Celery worker
-load_dotenv()
 
-# Config
-CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+@worker_process_init.connect
+def preload_engines(**kwargs):
+    """
+    Imports the analysis engines when a worker process starts, so the first
+    job does not pay for loading librosa/TensorFlow. The API never runs this,
+    and the exports worker disables it with PRELOAD_ENGINES=0.
+    """
+    if os.environ.get('PRELOAD_ENGINES', '1') == '0':
+        return
+    for module_name in sorted(set(analyzer._ENGINES.values())):
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"--- [WARN] Could not preload {module_name}: {e}")
+
+
+@worker_ready.connect
+def start_scheduler_heartbeat(**kwargs):
+    """
+    Runs scheduler.heartbeat() every SCHEDULER_HEARTBEAT_SECONDS in the main
+    worker process, so jobs stranded by a crashed worker are dispatched
+    without waiting for the next upload.
+    """
+    def beat():
+        while True:
+            time.sleep(scheduler.HEARTBEAT_SECONDS)
+            try:
+                scheduler.heartbeat()
+            except Exception as e:
+                print(f"--- [WARN] Scheduler heartbeat failed: {e}")
+
+    threading.Thread(target=beat, name='scheduler-heartbeat', daemon=True).start()
+
+
+@task_prerun.connect
+def scheduler_job_started(task_id=None, **kwargs):
+    try:
+        scheduler.mark_started(task_id)
+    except Exception as e:
+        print(f"--- [WARN] Scheduler could not record start of {task_id}: {e}")
+
+
+@task_postrun.connect
+def scheduler_job_finished(task_id=None, **kwargs):
+    """Frees the job's slot so the scheduler can dispatch the next one."""
+    try:
+        scheduler.mark_finished(task_id)
+    except Exception as e:
+        print(f"--- [WARN] Scheduler could not record end of {task_id}: {e}")
+
+
+@task_postrun.connect
+def remove_work_dir(task=None, task_id=None, args=None, kwargs=None, **extra):
+    """
+    Deletes an analysis task's work directory (Demucs output and stem store,
+    about 0.8 GB for a 5-minute track) once it ends, successfully or not.
+    Stages only need it while the task runs; served renditions live outside.
+    """
+    if task is None or task.name != ANALYZE_AUDIO_TASK:
+        return
+    original_filename = (kwargs or {}).get('original_filename')
+    if original_filename is None and args and len(args) > 1:
+        original_filename = args[1]
+    if not original_filename:
+        return
+    work_dir = _task_work_dir(original_filename, task_id)
+    if os.path.isdir(work_dir):
+        shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"--- [Internal] Removed work directory {work_dir} ---")
+
+
+def _song_output_dir(original_filename):
+    return os.path.join("results", original_filename.split('.')[0])
+
+
+def _task_work_dir(original_filename, task_id):
+    # Keyed by task: jobs for the same file may run at once on the short
+    # and long queues.
+    return os.path.join(_song_output_dir(original_filename), "work", task_id)
+
 
-celery = Celery(__name__, broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+def _remove_separation_output(separated):
+    """Deletes the Demucs output once its stems are in the stem store."""
+    for path in {os.path.dirname(p) for p in separated.values() if p}:
+        shutil.rmtree(path, ignore_errors=True)
 
-@celery.task(bind=True)
-def analyze_audio_task(self, file_path, original_filename):
+
+@celery.task(bind=True, name=ANALYZE_AUDIO_TASK)
+def analyze_audio_task(self, file_path, original_filename, stages=None):
     """
     Background task to process audio.
+    Only the requested stages run (see task_signatures.STAGES); None runs all.
     """
     print(f"--- [DEBUG] Task Started for {original_filename} ---")
+    stages = normalize_stages(stages)
 
 
     # This dictionary will accumulate all partial results.
@@ -36,27 +126,42 @@ def analyze_audio_task(self, file_path, original_filename):
     # 1. Basic Metadata
     update_progress('Analyzing BPM and Key...', 'Analyzing metadata', 10)
     print("--- [DEBUG] Step 1: Calling analyze_meta ---")
-    meta_data = analyzer.analyze_meta(file_path)
+    meta_data = analyzer.analyze_meta(file_path, original_filename)
     partial_results['metadata'] = meta_data
     update_progress('Metadata complete', 'Metadata analyzed', 15) # 15%
     print(f"--- [DEBUG] Step 1 Complete (Metadata): {meta_data} ---")
     
     # 2. Stem Separation
-    update_progress('Separating Stems (This takes a while)...', 'Separating stems', 20)
     song_id = original_filename.split('.')[0]
-    output_dir = os.path.join("results", song_id)
+    output_dir = _song_output_dir(original_filename)
     os.makedirs(output_dir, exist_ok=True)
-    print("--- [DEBUG] Step 2: Starting Demucs Separation ---")
-    stems = analyzer.separate_stems(file_path, output_dir)
+    stems = {}
+    store = None
+    if 'stems' in stages:
+        update_progress('Separating Stems (This takes a while)...', 'Separating stems', 20)
+        print("--- [DEBUG] Step 2: Starting Demucs Separation ---")
+        work_dir = _task_work_dir(original_filename, self.request.id)
+        os.makedirs(work_dir, exist_ok=True)
+        separated = analyzer.separate_stems(file_path, work_dir)
+        # Decode each stem once into the memory-mapped stem store; later
+        # stages read it instead of the Demucs WAVs, and the files served to
+        # clients are renditions derived from it.
+        store = stem_store.ingest(separated, work_dir)
+        stems = stem_store.write_renditions(store, output_dir)
+        _remove_separation_output(separated)
     stems['master'] = file_path
     partial_results['stems'] = stems
     update_progress('Stems separated', 'Stems extracted', 50) # 50%
     print(f"--- [DEBUG] Step 2 Complete (Stems): {stems} ---")
    
     # 3. Analyze Individual Stems
-    update_progress('Analyzing individual stems...', 'Detecting notes', 55)
-    print("--- [DEBUG] Step 3: Analyzing notes for all relevant stems ---")
-    notes_by_stem = analyzer.analyze_notes_for_stems(stems)
+    notes_by_stem = {}
+    if 'notes' in stages:
+        update_progress('Analyzing individual stems...', 'Detecting notes', 55)
+        print("--- [DEBUG] Step 3: Analyzing notes for all relevant stems ---")
+        notes_by_stem = analyzer.analyze_notes_for_stems(stems, store=store)
+        # Keep notes ordered by start time so the time index matches the lists.
+        notes_by_stem = {stem: aligner.sort_events(notes) for stem, notes in notes_by_stem.items()}
     partial_results['notes'] = notes_by_stem
     update_progress('Notes detected', 'Notes detected', 75) # 75%
     
@@ -73,25 +178,32 @@ def analyze_audio_task(self, file_path, original_filename):
     
     # This new function tries UG first, then falls back to local Whisper.
     # It returns chords if UG is successful, otherwise chords are None.
-    analysis_result = analyzer.analyze_lyrics(lyrics_source_path, artist=artist, title=title)
-    lyrics = analysis_result.get("lyrics_lines", [])
-    chords = analysis_result.get("chords")
+    lyrics, chords = [], None
+    harmonic_features = None
+    if 'lyrics' in stages:
+        analysis_result = analyzer.analyze_lyrics(lyrics_source_path, artist=artist, title=title)
+        lyrics = analysis_result.get("lyrics_lines", [])
+        chords = analysis_result.get("chords")
 
     # If chords are None, it means UG failed and we need to run local chord analysis as a fallback.
-    if chords is None:
+    if chords is None and 'chords' in stages:
         print("--- [INFO] Running local chord analysis as fallback. ---")
-        chords = analyzer.analyze_chords(file_path)
+        chords, harmonic_features = analyzer.analyze_chords(file_path, return_features=True)
+    chords = chords or []
     partial_results['chords'] = chords
 
-    lyrics_doc_path = None
     merged_lyrics = []
     if lyrics and chords:
-        update_progress('Merging lyrics and generating sheet...', 'Generating lyrics sheet', 95)
+        update_progress('Merging lyrics and chords...', 'Merging lyrics', 95)
         merged_lyrics = analyzer.merge_lyrics_and_chords(lyrics, chords)
-        
-        doc_filename = f"{song_id}_lyrics.docx"
-        lyrics_doc_path = os.path.join(output_dir, doc_filename)
-        analyzer.create_lyrics_doc(original_filename, merged_lyrics, lyrics_doc_path)
+
+    # Lyric sheets (DOCX, PDF, ChordPro, text) and MIDI are rendered on demand
+    # by the exports worker when first downloaded, see render_export_task.
+    exports = exporter.export_paths(
+        self.request.id, song_id,
+        has_sheet=bool(merged_lyrics),
+        has_notes=any(notes_by_stem.values()),
+    )
 
     update_progress('Analysis complete', 'Finalizing', 100)
 
@@ -108,7 +220,33 @@ def analyze_audio_task(self, file_path, original_filename):
         "stems": stems,
         "song_id": song_id,
         "lyrics_data": final_lyrics_data,
-        "lyrics_doc": lyrics_doc_path,
+        "lyrics_doc": exports.get("docx"),
+        "exports": exports,
     }
+    # Exports are cached per version of the content they are rendered from;
+    # computed once here so serving a download never hashes the result.
+    exports["version"] = exporter.result_version(result)
+    # Segment tables per note stream so clients can look up the note at a
+    # given time with one binary search (see aligner.TimeIndex).
+    result["time_index"] = aligner.build_time_index(result)
+
+    # Add the track to the harmonic similarity index (see fingerprint.py).
+    # Indexing problems must never fail the analysis itself.
+    try:
+        fingerprint.index_track(
+            self.request.id, song_id, chords, meta_data,
+            beat_chroma=(harmonic_features or {}).get('beat_chroma'),
+        )
+    except Exception as e:
+        print(f"--- [WARN] Could not add {song_id} to the harmonic index: {e}")
     # Final (success) state is implicitly returned by celery; nothing else to update here
-    return result
\ No newline at end of file
+    return result
+
+@celery.task(name=RENDER_EXPORT_TASK)
+def render_export_task(task_id, fmt):
+    """
+    Renders one export (see exporter.EXPORT_FORMATS) of a finished analysis
+    task into the export cache and returns its path.
+    """
+    result = celery.AsyncResult(task_id).result
+    return exporter.get_export(result, fmt)
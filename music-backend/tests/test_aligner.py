@@ -0,0 +1,71 @@
+import aligner
+
+
+def chord(name, start, end):
+    return {"chord_name": name, "start_time": start, "end_time": end}
+
+
+def line(text, start, end, **extra):
+    return {"text": text, "start": start, "end": end, **extra}
+
+
+def test_chord_starting_exactly_at_line_start():
+    chords = [chord("C", 0.0, 2.0), chord("G", 2.0, 4.0)]
+    merged = aligner.merge_lyrics_and_chords([line("hello world", 2.0, 4.0)], chords)
+
+    assert merged[0]["chord"] == "G"
+    # C ends where the line starts, so it is not part of the line.
+    assert merged[0]["chords"] == [{"chord": "G", "time": 2.0, "offset": 0}]
+
+
+def test_multiple_chord_changes_per_line():
+    chords = [chord("C", 0.0, 1.0), chord("G", 1.0, 2.0), chord("Am", 2.0, 4.0)]
+    merged = aligner.merge_lyrics_and_chords([line("aaaa bbbb cccc dddd", 0.0, 4.0)], chords)
+
+    assert merged[0]["chord"] == "C"
+    assert [(c["chord"], c["time"], c["offset"]) for c in merged[0]["chords"]] == [
+        ("C", 0.0, 0),
+        ("G", 1.0, 5),
+        ("Am", 2.0, 10),
+    ]
+
+
+def test_chord_offsets_use_word_timings():
+    words = [
+        {"text": "one", "start": 0.0, "end": 0.5},
+        {"text": "two", "start": 0.5, "end": 3.0},
+        {"text": "three", "start": 3.0, "end": 4.0},
+    ]
+    chords = [chord("D", 0.0, 3.5), chord("A", 3.5, 5.0)]
+    merged = aligner.merge_lyrics_and_chords([line("one two three", 0.0, 4.0, words=words)], chords)
+
+    assert [(c["chord"], c["offset"]) for c in merged[0]["chords"]] == [("D", 0), ("A", 8)]
+    assert merged[0]["words"] == words
+
+
+def test_chord_analysis_error_is_ignored():
+    lyrics = [line("first", 0.0, 1.0), line("second", 1.0, 2.0)]
+    merged = aligner.merge_lyrics_and_chords(lyrics, [{"error": "Chord analysis failed"}])
+
+    assert [(m["text"], m["chord"], m["chords"]) for m in merged] == [
+        ("first", "N", []),
+        ("second", "N", []),
+    ]
+
+
+def test_lines_are_returned_in_time_order():
+    lyrics = [line("later", 5.0, 6.0), line("earlier", 0.0, 1.0)]
+    merged = aligner.merge_lyrics_and_chords(lyrics, [chord("E", 0.0, 6.0)])
+
+    assert [m["text"] for m in merged] == ["earlier", "later"]
+    assert aligner.merge_lyrics_and_chords([], [chord("E", 0.0, 6.0)]) == []
+
+
+def test_time_index_with_overlapping_notes():
+    # A sustained note under a run of short ones, as in a polyphonic stem.
+    notes = [{"start": 0.0, "end": 10.0}] + [{"start": 1.0 + i, "end": 1.5 + i} for i in range(5)]
+    index = aligner.TimeIndex(notes)
+
+    assert index.at([0.5, 1.2, 1.7, 9.9, 10.0, -1.0]).tolist() == [0, 1, 0, 0, -1, -1]
+    assert index.overlapping(2.2, 3.1).tolist() == [0, 2, 3]
+    assert index.overlapping(10.0, 11.0).tolist() == []
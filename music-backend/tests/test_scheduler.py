@@ -0,0 +1,158 @@
+import fakeredis
+import pytest
+
+import scheduler
+import task_signatures
+
+
+QUEUE = 'analysis.short'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sched(monkeypatch):
+    """
+    Scheduler on fakeredis with one slot per queue. The probed "duration" of
+    a file is used directly as the job's cost; dispatched task ids are
+    recorded instead of being sent to Celery.
+    """
+    r = fakeredis.FakeRedis(decode_responses=True)
+    clock = Clock()
+    costs = {}
+    sent = []
+    states = {}
+
+    monkeypatch.setattr(scheduler, '_redis', r)
+    monkeypatch.setattr(scheduler.time, 'time', clock)
+    monkeypatch.setattr(scheduler, 'probe_duration', lambda path: costs[path])
+    monkeypatch.setattr(scheduler, 'estimate_cost', lambda duration, stages=None: duration)
+    monkeypatch.setattr(scheduler, 'QUEUE_CLASSES', [(QUEUE, float('inf'))])
+    monkeypatch.setattr(scheduler, 'QUEUE_SLOTS', {QUEUE: 1})
+    monkeypatch.setattr(scheduler, 'ADMISSION_MAX_WAIT_SECONDS', 1000.0)
+    monkeypatch.setattr(task_signatures, 'analyze_audio', lambda *a, task_id=None, **k: sent.append(task_id))
+    monkeypatch.setattr(
+        task_signatures.celery, 'AsyncResult',
+        lambda task_id: type('Result', (), {'state': states.get(task_id, 'PENDING')})(),
+    )
+
+    class Harness:
+        pass
+
+    h = Harness()
+    h.r, h.clock, h.sent, h.states = r, clock, sent, states
+
+    def submit(task_id, cost):
+        costs[task_id] = cost
+        return scheduler.submit(task_id, task_id, f'{task_id}.mp3')
+
+    h.submit = submit
+    return h
+
+
+def test_shortest_job_runs_first(sched):
+    sched.submit('running', 100)
+    sched.submit('big', 300)
+    sched.submit('small', 50)
+    assert sched.sent == ['running']
+
+    scheduler.mark_finished('running')
+    assert sched.sent == ['running', 'small']
+    scheduler.mark_finished('small')
+    assert sched.sent == ['running', 'small', 'big']
+
+
+def test_aging_lets_old_jobs_overtake_cheaper_new_ones(sched):
+    sched.submit('running', 100)
+    sched.submit('old', 200)
+    # Waited long enough that its aged cost is below the newcomer's.
+    sched.clock.now += 300 / scheduler.AGING_RATE
+    sched.submit('new', 100)
+
+    scheduler.mark_finished('running')
+    assert sched.sent == ['running', 'old']
+
+
+def test_estimated_start_accounts_for_running_and_waiting_jobs(sched):
+    first = sched.submit('running', 100)
+    assert first['estimated_start_seconds'] == 0
+    second = sched.submit('waiting', 50)
+    assert second['estimated_start_seconds'] == 100
+
+    sched.clock.now += 40
+    # 60s left on the running job, then the 50s job ahead of it.
+    assert sched.submit('next', 80)['estimated_start_seconds'] == 110
+    assert scheduler.queue_status('waiting') == {
+        'queue': QUEUE,
+        'position': 1,
+        'estimated_cost_seconds': 50,
+        'estimated_start_seconds': 60,
+    }
+    assert scheduler.queue_status('running') is None
+
+
+def test_admission_rejects_when_wait_is_too_long(sched):
+    sched.submit('running', 900)
+    sched.submit('waiting', 200)
+
+    # A cheaper job would start first and still be admitted.
+    assert sched.submit('cheap', 10)['estimated_start_seconds'] == 900
+    with pytest.raises(scheduler.AdmissionRejected) as exc:
+        sched.submit('rejected', 300)
+    assert exc.value.estimated_start_seconds == 1110
+    # Nothing was stored for the rejected job.
+    assert not sched.r.exists('scheduler:job:rejected')
+    assert scheduler.queue_status('rejected') is None
+
+
+def test_mark_finished_releases_the_slot(sched):
+    sched.submit('running', 100)
+    sched.submit('waiting', 100)
+    assert sched.r.zrange(f'scheduler:{QUEUE}:running', 0, -1) == ['running']
+
+    scheduler.mark_finished('running')
+    assert sched.r.zrange(f'scheduler:{QUEUE}:running', 0, -1) == ['waiting']
+    assert not sched.r.exists('scheduler:job:running')
+
+
+def test_heartbeat_releases_jobs_lost_with_their_worker(sched):
+    sched.submit('crashed', 100)
+    sched.submit('waiting', 100)
+
+    # Still running: the heartbeat keeps its slot.
+    scheduler.heartbeat()
+    assert sched.sent == ['crashed']
+
+    # The worker died (WorkerLostError): no task_postrun, state is final.
+    sched.states['crashed'] = 'FAILURE'
+    scheduler.heartbeat()
+    assert sched.sent == ['crashed', 'waiting']
+    assert not sched.r.exists('scheduler:job:crashed')
+
+
+def test_cancel_waiting_and_running_jobs(sched):
+    sched.submit('running', 100)
+    sched.submit('waiting', 100)
+    sched.submit('other', 200)
+
+    assert scheduler.cancel('waiting') is True
+    assert sched.sent == ['running']
+
+    # Cancelling a dispatched job frees its slot for the next one.
+    assert scheduler.cancel('running') is False
+    assert sched.sent == ['running', 'other']
+    assert scheduler.cancel('unknown') is False
+
+
+def test_queue_routing_by_song_length():
+    short, medium, long_ = (q for q, _ in scheduler.QUEUE_CLASSES)
+    assert scheduler.queue_for_cost(scheduler.estimate_cost(60)) == short
+    assert scheduler.queue_for_cost(scheduler.estimate_cost(240)) == medium
+    assert scheduler.queue_for_cost(scheduler.estimate_cost(3600)) == long_
+    assert scheduler.queue_for_cost(scheduler.estimate_cost(300, ['meta', 'chords'])) == short
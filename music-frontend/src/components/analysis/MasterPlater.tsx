@@ -6,7 +6,7 @@ import { useStaticWaveform } from '../../hooks/useStaticWaveform';
 import { Waveform } from './Waveform';
 import { ChordNow } from './ChordNow';
 import { NotesDetector } from './NotesDetector';
-import { condenseChords, getDistinctChordNames } from '../../utils/chords';
+import { condenseChords, getChordIndexAtTime, getDistinctChordNames } from '../../utils/chords';
 import { getNoteAtTime, midiToNoteName } from '../../utils/notes';
 
 interface Props {
@@ -46,10 +46,7 @@ export function MasterPlayer({
 
   const activeChordIndex = useMemo(() => {
     if (!condensed.length || !duration) return -1;
-    const t = analysis.currentTime;
-    return condensed.findIndex(
-      (c) => t >= c.start_time && t < c.end_time,
-    );
+    return getChordIndexAtTime(analysis.currentTime, condensed);
   }, [condensed, analysis.currentTime, duration]);
 
   const activeChordName =
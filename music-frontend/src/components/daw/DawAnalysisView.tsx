@@ -1,8 +1,8 @@
 import React, { useEffect, useMemo, useRef, useState } from 'react';
-import { AnalysisResult as BaseAnalysisResult, StemName, NoteEvent } from '../../types/analysis';
+import { AnalysisResult as BaseAnalysisResult, StemName, NoteEvent, LyricChordChange } from '../../types/analysis';
 import { useAudioAnalyzer } from '../../hooks/useAudioAnalyzer';
 import { getFileUrl } from '../../lib/api';
-import { condenseChords } from '../../utils/chords';
+import { condenseChords, getChordIndexAtTime } from '../../utils/chords';
 import { getNoteAtTime, midiToNoteName } from '../../utils/notes';
 import { useStaticWaveform } from '../../hooks/useStaticWaveform';
 import { TransportBar } from './Transporter';
@@ -19,12 +19,14 @@ interface LyricLine {
   end: number;
   text: string;
   chord?: string;
+  chords?: LyricChordChange[];
 }
 
 // Extend the base result type to include new properties from the backend
 type AnalysisResult = BaseAnalysisResult & {
   lyrics_data?: LyricLine[];
   lyrics_doc?: string | null;
+  exports?: Record<string, string>;
   lyrics_task_id?: string;
 };
 
@@ -99,13 +101,10 @@ export const DawAnalysisView: React.FC<DawAnalysisViewProps> = ({ result }) => {
   const mainAudioRef = useRef<HTMLAudioElement | null>(null);
   const mainAnalysis = useAudioAnalyzer(mainAudioRef);
 
-  const activeChord = useMemo(
-    () =>
-      chordsCondensed.find(
-        (c) => mainAnalysis.currentTime >= c.start_time && mainAnalysis.currentTime < c.end_time,
-      )?.chord_name ?? '--',
-    [chordsCondensed, mainAnalysis.currentTime],
-  );
+  const activeChord = useMemo(() => {
+    const i = getChordIndexAtTime(mainAnalysis.currentTime, chordsCondensed);
+    return i >= 0 ? chordsCondensed[i].chord_name : '--';
+  }, [chordsCondensed, mainAnalysis.currentTime]);
 
  const mainStripSamples = waveformMap[activeStem];
   const duration =
@@ -146,7 +145,12 @@ export const DawAnalysisView: React.FC<DawAnalysisViewProps> = ({ result }) => {
     (result.notes && result.notes.master) ||
     undefined;
 
-  const activeNote = getNoteAtTime(mainAnalysis.currentTime, notesForSource);
+  const notesIndexKey = result.notes && result.notes[activeStem] ? activeStem : 'master';
+  const activeNote = getNoteAtTime(
+    mainAnalysis.currentTime,
+    notesForSource,
+    result.time_index?.notes?.[notesIndexKey],
+  );
   const activeNoteName = activeNote ? midiToNoteName(activeNote.pitch) : null;
 
   const noteLabel =
@@ -344,6 +348,7 @@ export const DawAnalysisView: React.FC<DawAnalysisViewProps> = ({ result }) => {
         stems={result.stems}
         songId={result.song_id}
         lyricsDocPath={lyricsDoc}
+        exports={result.exports}
       />
       {/* Floating "Now" Chord Display */}
       <div className="fixed bottom-6 left-6 z-50 flex-col items-center gap-2 rounded-2xl border border-app bg-app-elevated p-3 shadow-2xl">
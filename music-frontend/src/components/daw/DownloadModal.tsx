@@ -8,18 +8,49 @@ interface DownloadModalProps {
   stems: AnalysisResult['stems'];
   songId: string;
   lyricsDocPath?: string | null;
+  exports?: Record<string, string>;
 }
 
 const stemOrder: (StemName | 'master')[] = ['master', 'vocals', 'drums', 'bass', 'guitar', 'piano', 'other'];
 
-export const DownloadModal: React.FC<DownloadModalProps> = ({ isOpen, onClose, stems, songId, lyricsDocPath }) => {
+// Lyric sheet formats rendered on demand by the backend (see exporter.py)
+const sheetFormats: { ext: string; label: string }[] = [
+  { ext: 'docx', label: '.docx' },
+  { ext: 'pdf', label: '.pdf' },
+  { ext: 'cho', label: 'ChordPro' },
+  { ext: 'txt', label: '.txt' },
+];
+
+const EXPORT_MAX_WAIT_MS = 120_000;
+
+/**
+ * Exports are rendered by the backend on first request: it answers 202 with
+ * Retry-After until the file is ready. Polls with HEAD so the file itself is
+ * only transferred once. Resolves to true when the file can be downloaded.
+ */
+async function waitForExport(url: string): Promise<boolean> {
+  const deadline = Date.now() + EXPORT_MAX_WAIT_MS;
+  while (Date.now() < deadline) {
+    const res = await fetch(url, { method: 'HEAD' });
+    if (res.status !== 202 && res.status !== 503) return res.ok;
+    const retryAfter = Number(res.headers.get('Retry-After')) || 2;
+    await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+  }
+  return false;
+}
+
+export const DownloadModal: React.FC<DownloadModalProps> = ({ isOpen, onClose, stems, songId, lyricsDocPath, exports }) => {
   if (!isOpen) {
     return null;
   }
 
-  const handleDownload = (stemPath: string, stemName: string) => {
+  const handleDownload = async (stemPath: string, stemName: string, rendered = false) => {
     const baseUrl = getFileUrl(stemPath);
     if (!baseUrl) return;
+    if (rendered && !(await waitForExport(baseUrl))) {
+      alert('This export could not be prepared. Please try again later.');
+      return;
+    }
     // Append query param to trigger "Save As" dialog via backend header
     const url = `${baseUrl}?download=true`;
 
@@ -59,14 +90,30 @@ export const DownloadModal: React.FC<DownloadModalProps> = ({ isOpen, onClose, s
                 </svg>
                 <span className="font-medium capitalize text-app">Lyrics & Chords Sheet</span>
               </div>
+              <div className="flex flex-wrap justify-end gap-1">
+                {(exports ? sheetFormats.filter(({ ext }) => exports[ext]) : [{ ext: 'docx', label: '.docx' }]).map(({ ext, label }) => (
+                  <button
+                    key={ext}
+                    onClick={() => handleDownload(exports?.[ext] || lyricsDocPath || '', 'lyrics-chords', true)}
+                    className="flex items-center gap-2 px-3 py-1.5 text-xs font-semibold bg-app-accent text-app rounded-md hover:bg-app-accent/80 transition-colors"
+                  >
+                    {label}
+                  </button>
+                ))}
+              </div>
+            </div>
+          )}
+          {exports?.mid && (
+            <div className="flex items-center justify-between p-3 bg-app rounded-lg border border-app">
+              <span className="font-medium text-app">Notes (MIDI)</span>
               <button
-                onClick={() => handleDownload(lyricsDocPath, 'lyrics-chords')}
+                onClick={() => handleDownload(exports.mid, 'notes', true)}
                 className="flex items-center gap-2 px-3 py-1.5 text-xs font-semibold bg-app-accent text-app rounded-md hover:bg-app-accent/80 transition-colors"
               >
                 <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4" fill="none" viewBox="0 0 24 24" stroke="currentColor" strokeWidth={2}>
                   <path strokeLinecap="round" strokeLinejoin="round" d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4" />
                 </svg>
-                Download (.docx)
+                Download (.mid)
               </button>
             </div>
           )}
@@ -90,7 +137,7 @@ export const DownloadModal: React.FC<DownloadModalProps> = ({ isOpen, onClose, s
           })}
         </div>
 
-        <p className="text-xs text-app-muted mt-4 text-center">Files are provided in .wav and .docx format.</p>
+        <p className="text-xs text-app-muted mt-4 text-center">Stems are provided in .wav format. Sheets and MIDI are generated when first downloaded.</p>
       </div>
     </div>
   );
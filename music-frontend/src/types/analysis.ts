@@ -1,3 +1,4 @@
+import { StreamIndex } from '../utils/timeIndex';
 
 export interface TrackMetadata {
   bpm: number;
@@ -40,17 +41,38 @@ export type StemsMap = Record<StemName, string | undefined>;
 
 export type NotesByStem = Partial<Record<StemName, NoteEvent[]>>;
 
+// A chord change inside a lyric line; offset is the character position in the text.
+export interface LyricChordChange {
+  chord: string;
+  time: number;
+  offset: number;
+}
+
 export interface AnalysisResult {
   metadata: TrackMetadata;
   chords: ChordEvent[];
    stems: StemsMap;
   song_id: string;
    notes?: Partial<Record<StemName | 'master', NoteEvent[]>>;
+  time_index?: {
+    notes?: Partial<Record<StemName | 'master', StreamIndex>>;
+  };
 }
 
 export interface UploadResponse {
   task_id: string;
   message: string;
+  queue?: string;
+  estimated_cost_seconds?: number;
+  estimated_start_seconds?: number;
+}
+
+// Scheduler position of a job that has not reached a worker yet
+export interface QueueInfo {
+  queue: string;
+  position: number;
+  estimated_cost_seconds: number;
+  estimated_start_seconds: number;
 }
 
 export type TaskState = 'PENDING' | 'PROCESSING' | 'SUCCESS' | 'FAILURE';
@@ -59,6 +81,7 @@ export interface StatusInfo {
   progress?: number; // 0..100
   step?: string; // short step id e.g. 'separate_stems'
   partial?: PartialResults; // small partial results like metadata/stems
+  queue?: QueueInfo; // set while the job waits for a worker
   error?: string;
 }
 
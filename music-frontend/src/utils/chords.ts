@@ -1,4 +1,5 @@
 import { ChordEvent } from '../types/analysis';
+import { buildStreamIndex, findActiveIndex } from './timeIndex';
 
 export function condenseChords(chords: ChordEvent[]): ChordEvent[] {
   if (!chords.length) return [];
@@ -19,3 +20,12 @@ export function getDistinctChordNames(chords: ChordEvent[]): string[] {
   for (const c of chords) set.add(c.chord_name);
   return Array.from(set);
 }
+
+/**
+ * Index of the chord active at time t in a sorted chord list, or -1.
+ */
+export function getChordIndexAtTime(t: number, chords: ChordEvent[]): number {
+  if (!chords.length) return -1;
+  const index = buildStreamIndex(chords, (c) => c.start_time, (c) => c.end_time);
+  return findActiveIndex(t, index);
+}
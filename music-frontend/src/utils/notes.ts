@@ -1,4 +1,5 @@
 import { NoteEvent } from '../types/analysis';
+import { StreamIndex, buildStreamIndex, findActiveIndex } from './timeIndex';
 
 const NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'];
 
@@ -10,18 +11,18 @@ export function midiToNoteName(pitch: number): string {
 }
 
 /**
- * Given a time and a list of note events, return the active note (if any).
+ * Given a time and a list of note events (sorted by start), return the
+ * active note (if any). Pass the backend's precomputed index when available.
  */
 export function getNoteAtTime(
   t: number,
   notes: NoteEvent[] | undefined,
+  index?: StreamIndex,
 ): NoteEvent | null {
   if (!notes || !notes.length) return null;
-  // Simple linear scan – good enough; if needed we can binary-search later.
-  for (const n of notes) {
-    if (t >= n.start && t <= n.end) {
-      return n;
-    }
-  }
-  return null;
+  const idx = index && index.count === notes.length
+    ? index
+    : buildStreamIndex(notes, (n) => n.start, (n) => n.end);
+  const i = findActiveIndex(t, idx);
+  return i >= 0 ? notes[i] : null;
 }
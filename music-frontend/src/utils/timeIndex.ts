@@ -0,0 +1,91 @@
+/**
+ * Elementary-segment table for a timed event stream, as precomputed by the
+ * backend (`time_index` in the analysis result, see aligner.py).
+ * `bounds` holds every distinct start/end time and `active[i]` the index of
+ * the latest-starting event active on [bounds[i], bounds[i+1]), or -1.
+ * `count` is the number of events the table was built from.
+ */
+export interface StreamIndex {
+  count: number;
+  bounds: number[];
+  active: number[];
+}
+
+const builtIndexes = new WeakMap<object, StreamIndex>();
+
+/**
+ * Build (and cache per array) an index for events already sorted by start.
+ * Sweeps the distinct times with a max-heap of active event indexes; ended
+ * events are dropped when they reach the top.
+ */
+export function buildStreamIndex<T>(
+  events: T[],
+  getStart: (e: T) => number,
+  getEnd: (e: T) => number,
+): StreamIndex {
+  const cached = builtIndexes.get(events);
+  if (cached) return cached;
+
+  const times = new Set<number>();
+  for (const e of events) {
+    times.add(getStart(e));
+    times.add(getEnd(e));
+  }
+  const bounds = Array.from(times).sort((a, b) => a - b);
+  const active: number[] = [];
+
+  const heap: number[] = [];
+  const push = (v: number) => {
+    heap.push(v);
+    let i = heap.length - 1;
+    while (i > 0) {
+      const parent = (i - 1) >> 1;
+      if (heap[parent] >= heap[i]) break;
+      [heap[parent], heap[i]] = [heap[i], heap[parent]];
+      i = parent;
+    }
+  };
+  const pop = () => {
+    const last = heap.pop() as number;
+    if (!heap.length) return;
+    heap[0] = last;
+    let i = 0;
+    for (;;) {
+      const l = 2 * i + 1;
+      const r = l + 1;
+      let top = i;
+      if (l < heap.length && heap[l] > heap[top]) top = l;
+      if (r < heap.length && heap[r] > heap[top]) top = r;
+      if (top === i) break;
+      [heap[top], heap[i]] = [heap[i], heap[top]];
+      i = top;
+    }
+  };
+
+  let j = 0;
+  for (const b of bounds) {
+    while (j < events.length && getStart(events[j]) <= b) push(j++);
+    while (heap.length && getEnd(events[heap[0]]) <= b) pop();
+    active.push(heap.length ? heap[0] : -1);
+  }
+
+  const index = { count: events.length, bounds, active };
+  builtIndexes.set(events, index);
+  return index;
+}
+
+/**
+ * Index of the latest-starting event active at time t (start <= t < end),
+ * or -1. One binary search over the segment bounds.
+ */
+export function findActiveIndex(t: number, index: StreamIndex): number {
+  const { bounds, active } = index;
+  let lo = 0;
+  let hi = bounds.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (bounds[mid] <= t) lo = mid + 1;
+    else hi = mid;
+  }
+  return lo > 0 ? active[lo - 1] : -1;
+}